@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Рендер по умолчанию идёт во внеэкранный контекст (EGL), окно не нужно
+if "--window" not in sys.argv:
+    os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import arcade
+import game
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+PHASES = [
+    "particles.update",
+    "particles.draw",
+    "game.on_update",
+    "game.on_draw",
+    "save.record_run",
+    "save.flush"]
+# Фазы, которые не зависят от числа объектов, меряются один раз
+UNSCALED_PHASES = {"save.record_run", "save.flush"}
+DRAW_PHASES = {"particles.draw", "game.on_draw"}
+DEFAULT_DRAW_LIMIT = 10000
+
+
+def make_level(count, width=game.SCREEN_WIDTH):
+    # Синтетический уровень в схеме LEVELS: сетка платформ на всю ширину
+    # мира и по count монет, врагов и шипов
+    platforms = [[0, 120, width, 40]]
+    for row in range(4):
+        for col in range(max(5, width // 230)):
+            platforms.append([60 + col * 230, 230 + row * 120, 160, 20])
+    return {
+        "name": f"Нагрузка {count}",
+        "time": 10 ** 6,
+        "coins": count,
+        "enemies": count,
+        "hazards": count,
+        "background": (30, 30, 50),
+        "width": width,
+        "platforms": platforms}
+
+
+def fill_particles(particle_system, count):
+    particle_system.clear()
+    particle_system.add_particle(
+        game.SCREEN_WIDTH / 2, game.SCREEN_HEIGHT / 2,
+        count=count,
+        speed=0.5,
+        lifetime=10 ** 6,
+        gravity_effect=0.0)
+
+
+def time_frames(frame, frames, budget):
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < frames:
+        frame_start = time.perf_counter()
+        frame()
+        samples.append(time.perf_counter() - frame_start)
+        if len(samples) >= 3 and time.perf_counter() - started > budget:
+            break
+    return statistics.median(samples) * 1000, len(samples)
+
+
+def measure_allocations(frame, frames=1):
+    # Пиковый прирост памяти Python за кадр, в КиБ
+    tracemalloc.start()
+    frame()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for _ in range(frames):
+        frame()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return max(0.0, (peak - before) / 1024)
+
+
+class Scenario:
+    def __init__(self, window, size, width):
+        self.window = window
+        self.size = size
+        # Замеряется сама система частиц, без бюджета
+        self.particle_system = game.ParticleSystem(budget=None)
+        fill_particles(self.particle_system, size)
+        self.view = game.GameView()
+        self.level_data = make_level(size, width)
+        self.level_num = 1000 + size
+        self.reload()
+        window.show_view(self.view)
+
+    def reload(self):
+        state = self.view.state
+        # Одинаковая расстановка от прогона к прогону
+        state.rng.seed(self.size)
+        state.load_level_data(self.level_num, self.level_data)
+        state.lives = 10 ** 9
+        self.view.handle_events()
+
+    def particles_update(self):
+        self.particle_system.update(game.SIMULATION_DT)
+
+    def particles_draw(self):
+        self.window.clear()
+        self.particle_system.draw()
+        self.window.ctx.finish()
+
+    def game_on_update(self):
+        state = self.view.state
+        if state.game_over or state.level_complete:
+            self.reload()
+        self.view.on_update(game.SIMULATION_DT)
+
+    def game_on_draw(self):
+        self.view.on_draw()
+        self.window.ctx.finish()
+
+
+class SaveScenario:
+    def __init__(self, directory):
+        self.repository = game.SaveRepository(os.path.join(directory, "bench_save.json"))
+
+    def save_record_run(self):
+        self.repository.record_run(3, 1000, 10)
+
+    def save_flush(self):
+        self.repository._dirty = True
+        self.repository.flush()
+
+
+def run(sizes, phases, frames, budget, allocations, draw_limit, width):
+    window = arcade.Window(game.SCREEN_WIDTH, game.SCREEN_HEIGHT, game.SCREEN_TITLE)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # Забеги из бенчмарка не должны попадать в настоящее сохранение
+        game.SaveRepository._instance = game.SaveRepository(
+            os.path.join(directory, "game_save.json"))
+
+        save_scenario = SaveScenario(directory)
+        for phase in phases:
+            if phase not in UNSCALED_PHASES:
+                continue
+            frame = getattr(save_scenario, phase.replace(".", "_"))
+            results.setdefault(phase, {})["1"] = measure(frame, frames, budget, allocations)
+            report(phase, 1, results[phase]["1"])
+
+        for size in sizes:
+            scenario = Scenario(window, size, width)
+            for phase in phases:
+                if phase in UNSCALED_PHASES:
+                    continue
+                if phase in DRAW_PHASES and size > draw_limit:
+                    print(f"{phase:18} {size:>7} пропущено (--draw-limit {draw_limit})")
+                    continue
+                frame = getattr(scenario, phase.replace(".", "_"))
+                results.setdefault(phase, {})[str(size)] = measure(frame, frames, budget, allocations)
+                report(phase, size, results[phase][str(size)])
+        game.SaveRepository._instance.close()
+        save_scenario.repository.close()
+    window.close()
+    return results
+
+
+def measure(frame, frames, budget, allocations):
+    frame()
+    ms, count = time_frames(frame, frames, budget)
+    result = {"ms": round(ms, 4), "frames": count}
+    if allocations:
+        result["alloc_kib"] = round(measure_allocations(frame), 1)
+    return result
+
+
+def report(phase, size, result):
+    alloc = f"{result['alloc_kib']:10.1f} КиБ" if "alloc_kib" in result else ""
+    print(f"{phase:18} {size:>7} {result['ms']:10.3f} мс/кадр {alloc}")
+    sys.stdout.flush()
+
+
+def compare(results, baseline, tolerance, min_delta):
+    regressions = []
+    for phase, by_size in results.items():
+        for size, result in by_size.items():
+            reference = baseline.get(phase, {}).get(size)
+            if reference is None:
+                continue
+            limit = max(reference["ms"] * (1 + tolerance), reference["ms"] + min_delta)
+            if result["ms"] > limit:
+                regressions.append((phase, size, reference["ms"], result["ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочные замеры игры")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="число объектов в сценариях через запятую")
+    parser.add_argument("--phases", default=",".join(PHASES),
+                        help="замеряемые фазы через запятую")
+    parser.add_argument("--frames", type=int, default=60,
+                        help="кадров на замер")
+    parser.add_argument("--budget", type=float, default=2.0,
+                        help="предел времени на один замер, сек")
+    parser.add_argument("--draw-limit", type=int, default=DEFAULT_DRAW_LIMIT,
+                        help="не замерять отрисовку сценариев крупнее этого")
+    parser.add_argument("--world-width", type=int, default=game.SCREEN_WIDTH,
+                        help="ширина мира сценариев: шире экрана — с прокруткой и отсечением")
+    parser.add_argument("--no-allocations", action="store_true",
+                        help="не замерять выделения памяти")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="записать результаты как новую базу")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="допустимое относительное замедление")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="замедление меньше стольких мс не считается регрессией")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--window", action="store_true",
+                        help="рисовать в обычном окне, а не во внеэкранном контексте")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    phases = [phase for phase in args.phases.split(",") if phase]
+    results = run(sizes, phases, args.frames, args.budget,
+                  not args.no_allocations, args.draw_limit, args.world_width)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+        print(f"База записана в {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Нет базы {args.baseline}, сравнение пропущено")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    for phase, size, before, after in regressions:
+        print(f"РЕГРЕССИЯ {phase} [{size}]: {before:.3f} -> {after:.3f} мс/кадр")
+    if regressions:
+        return 1
+    print("Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import os
+import sys
+
+# Правила игры не требуют окна: step() и swept_aabb() работают без OpenGL
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import game
+
+
+STEP_SIZES = (game.SIMULATION_DT, 3 * game.SIMULATION_DT, 0.1, 0.25)
+FALL_SPEED = -45
+
+
+def empty_state(level):
+    # Уровень без врагов и шипов: проверяется только игрок
+    state = game.GameState(level, seed=1)
+    state.enemies.x[:] = -10000
+    state.hazards.x[:] = -10000
+    state.build_spatial_hash()
+    return state
+
+
+def place(state, x, y, dy=0):
+    state.player_x, state.player_y = x, y
+    state.prev_player_x, state.prev_player_y = x, y
+    state.player_dy = dy
+    state.jumping = True
+
+
+def standing_on(state, platform):
+    plat_x, plat_y, plat_w, plat_h = platform
+    return not state.jumping and state.player_y == plat_y + plat_h + game.PLAYER_SIZE / 2
+
+
+def check_tunnelling():
+    # Игрок падает на середину каждой тонкой платформы с большой скоростью
+    # и при любом шаге должен встать на неё, а не проскочить
+    failures = []
+    for level in sorted(game.LEVELS):
+        platforms = game.GameState(level, seed=1).platforms
+        for index, platform in enumerate(platforms):
+            plat_x, plat_y, plat_w, plat_h = platform
+            if index == 0 or plat_h > 20:
+                continue
+            for delta_time in STEP_SIZES:
+                state = empty_state(level)
+                place(state, plat_x + plat_w / 2,
+                      plat_y + plat_h + game.PLAYER_SIZE / 2 + 5, FALL_SPEED)
+                game.step(state, game.StepInput(), delta_time)
+                if not standing_on(state, platform):
+                    failures.append(f"уровень {level}, платформа {index}, шаг {delta_time:.3f}")
+    return failures
+
+
+def check_fall_death():
+    # Длинный шаг уводит игрока ниже края пропасти, но по пути он встаёт на землю
+    failures = []
+    for delta_time in (0.1, 0.2):
+        state = empty_state(3)
+        place(state, 100, 300, -25)
+        game.step(state, game.StepInput(), delta_time)
+        if state.game_over or not standing_on(state, state.platforms[0]):
+            failures.append(f"падение с шагом {delta_time}: y={state.player_y}, жизней {state.lives}")
+    return failures
+
+
+def check_edge_landing():
+    # Касание верхней грани в начале шага засчитывается, даже если к концу
+    # шага игрок уже за краем платформы
+    platform = [200, 380, 200, 25]
+    state = empty_state(2)
+    assert platform in state.platforms
+    place(state, 260, 450)
+    game.step(state, game.StepInput(move=1), 0.5)
+    if not standing_on(state, platform):
+        return [f"край платформы: y={state.player_y}"]
+    return []
+
+
+def check_stacked():
+    # Из двух тонких платформ друг над другом встаём на верхнюю; сбоку
+    # платформа проходима
+    failures = []
+    level = dict(game.LEVELS[1], platforms=[[0, 120, 1200, 40],
+                                            [500, 300, 100, 15],
+                                            [500, 250, 100, 15]])
+    for move, x, expected in ((0, 550, 1), (1, 470, 2)):
+        state = empty_state(1)
+        state.load_level_data(1, level)
+        state.enemies.x[:] = -10000
+        state.hazards.x[:] = -10000
+        state.build_spatial_hash()
+        place(state, x, 400, -60)
+        game.step(state, game.StepInput(move=move), 0.1)
+        if not standing_on(state, state.platforms[expected]):
+            failures.append(f"платформы друг над другом, x={x}: y={state.player_y}")
+    return failures
+
+
+def check_swept_aabb():
+    failures = []
+    cases = [
+        ((0, 10, 0, -20, 1, (-5, 0, 10, 2)), (0.35, 1)),
+        ((0, 0, 0, -20, 1, (-5, 0, 10, 2)), None),
+        ((-20, 1, 20, 0, 1, (-5, 0, 10, 2)), (0.7, 0)),
+        ((20, 10, 0, -20, 1, (-5, 0, 10, 2)), None)]
+    for args, expected in cases:
+        result = game.swept_aabb(*args)
+        if result != expected:
+            failures.append(f"swept_aabb{args} = {result}, ожидалось {expected}")
+    return failures
+
+
+CHECKS = [check_swept_aabb, check_tunnelling, check_fall_death,
+          check_edge_landing, check_stacked]
+
+
+def main():
+    failures = []
+    for check in CHECKS:
+        found = check()
+        print(f"{check.__name__}: {'ошибок нет' if not found else len(found)}")
+        failures.extend(found)
+    for failure in failures:
+        print(f"  {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,28 @@
+import time
+# Отсчёт запуска для --profile-startup начинается до импорта arcade
+STARTUP_STARTED = time.perf_counter()
+
+import argparse
 import arcade
+import numpy as np
+import pyglet
 import random
+import sys
 import math
 import json
 import os
+import atexit
+import tempfile
+import threading
+import zlib
+import hashlib
+import sqlite3
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from PIL import Image
+from typing import Tuple, Optional
 
 
 SCREEN_WIDTH = 1200
@@ -21,31 +39,152 @@ GRAVITY = 0.8
 PLAYER_JUMP_SPEED = 16
 PLAYER_MOVE_SPEED = 6
 PLAYER_SIZE = 45
+PLAYER_SPAWN = (200, 300)
 COIN_SIZE = 22
 ENEMY_SIZE = 45
 HAZARD_WIDTH = 65
 HAZARD_HEIGHT = 25
 SAVE_FILE = "game_save.json"
+# Журнал забегов лежит рядом с файлом сохранения
+HISTORY_FILE = "game_history.db"
+SPRITE_CACHE_DIR = "sprite_cache"
+# Готовые кадры для быстрого запуска (картинка меню)
+WARM_CACHE_DIR = "warm_cache"
+LEVELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels")
+# Симуляция идёт фиксированными тиками независимо от частоты кадров
+SIMULATION_RATE = 60
+SIMULATION_DT = 1 / SIMULATION_RATE
+MAX_STEPS_PER_FRAME = 5
+# Уровень может быть шире экрана ("width" в LEVELS): камера следует за
+# игроком, а всё дальше CULL_MARGIN от видимой области не рисуется и не анимируется
+CULL_MARGIN = 200
+# Сколько частиц может жить одновременно (ParticleSystem.budget)
+PARTICLE_BUDGET = 3000
 
 
 
-@dataclass
-class Particle:
-    x: float
-    y: float
-    vx: float
-    vy: float
-    color: Tuple[int, int, int]
-    size: float
-    lifetime: float
-    age: float = 0.0
-    fade_out: bool = True
-    gravity_effect: float = 1.0
-
-
 class ParticleSystem:
-    def __init__(self):
-        self.particles: List[Particle] = []
+    # Частицы хранятся столбцами в заранее выделенных массивах NumPy:
+    # живые частицы всегда занимают срез [0, count).
+    INITIAL_CAPACITY = 1024
+    # Эффект: метод, приоритет и перезарядка в секундах. Когда бюджет
+    # заполняется, эффекты редеют и живут меньше (LOD), начиная с
+    # украшений; игровой отклик вытесняет частицы с меньшим приоритетом.
+    EFFECTS = {
+        "sparkle": ("create_sparkle_effect", 0, 0.0),
+        "jump": ("create_jump_effect", 1, 0.0),
+        "landing": ("create_landing_effect", 1, 0.1),
+        "coin": ("create_coin_effect", 2, 0.0),
+        "enemy_hit": ("create_enemy_hit_effect", 2, 0.25),
+        "hazard_hit": ("create_hazard_effect", 2, 0.25),
+        "life_restored": ("create_life_restored_effect", 3, 0.0),
+        "level_complete": ("create_level_complete_effect", 3, 0.0)}
+    TOP_PRIORITY = 3
+    # С какой заполненности бюджета эффекты каждого приоритета начинают
+    # редеть и до какой доли количества
+    LOD_START = (0.25, 0.5, 0.75, 0.9)
+    LOD_FLOOR = (0.0, 0.0, 0.25, 0.5)
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY, seed=None,
+                 budget: Optional[int] = PARTICLE_BUDGET):
+        # Косметический поток случайных чисел, отдельный от игрового
+        # GameState.rng: частицы не влияют на воспроизведение забега
+        self.rng = np.random.default_rng(seed)
+        self.effect_rng = random.Random(seed)
+        self.count = 0
+        # None — без ограничения
+        self.budget = budget
+        self.clock = 0.0
+        self.last_emitted = {}
+        # Приоритет и LOD текущего эффекта; add_particle вне emit() — в полную силу
+        self.emission = (self.TOP_PRIORITY, 1.0)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.capacity = capacity
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.age = np.zeros(capacity, dtype=np.float32)
+        self.lifetime = np.ones(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.float32)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.gravity_effect = np.zeros(capacity, dtype=np.float32)
+        self.fade_out = np.zeros(capacity, dtype=np.bool_)
+        self.priority = np.zeros(capacity, dtype=np.uint8)
+
+    def _columns(self):
+        return (self.x, self.y, self.vx, self.vy, self.age, self.lifetime,
+                self.size, self.color, self.gravity_effect, self.fade_out,
+                self.priority)
+
+    def _reserve(self, extra: int):
+        needed = self.count + extra
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        old_columns = self._columns()
+        self._allocate(capacity)
+        for new_column, old_column in zip(self._columns(), old_columns):
+            new_column[:self.count] = old_column[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def _remove(self, mask):
+        # Уплотнение: живые частицы из хвоста переезжают в дыры слева
+        n = self.count
+        removed = int(np.count_nonzero(mask))
+        if removed:
+            alive_count = n - removed
+            holes = np.flatnonzero(mask[:alive_count])
+            if holes.size:
+                fillers = alive_count + np.flatnonzero(~mask[alive_count:])
+                for column in self._columns():
+                    column[holes] = column[fillers]
+            self.count = alive_count
+        return removed
+
+    def _evict(self, priority, needed):
+        # Освобождает место под эффект, убирая самые «дожившие» частицы
+        # с меньшим приоритетом
+        n = self.count
+        candidates = np.flatnonzero(self.priority[:n] < priority)
+        if not candidates.size:
+            return 0
+        progress = self.age[candidates] / self.lifetime[candidates]
+        mask = np.zeros(n, dtype=bool)
+        mask[candidates[np.argsort(-progress)[:needed]]] = True
+        return self._remove(mask)
+
+    def lod(self, priority):
+        if self.budget is None:
+            return 1.0
+        load = self.count / self.budget
+        start = self.LOD_START[priority]
+        scale = (1.0 - load) / (1.0 - start)
+        return min(1.0, max(self.LOD_FLOOR[priority], scale))
+
+    def emit(self, kind, x: float, y: float):
+        method, priority, cooldown = self.EFFECTS[kind]
+        last = self.last_emitted.get(kind)
+        if last is not None and self.clock - last < cooldown:
+            return
+        scale = self.lod(priority)
+        if scale <= 0:
+            return
+        self.last_emitted[kind] = self.clock
+        self.emission = (priority, scale)
+        try:
+            getattr(self, method)(x, y)
+        finally:
+            self.emission = (self.TOP_PRIORITY, 1.0)
 
     def add_particle(self, x: float, y: float,
                      color: Tuple[int, int, int] = (255, 255, 255),
@@ -55,28 +194,44 @@ class ParticleSystem:
                      lifetime: float = 1.0,
                      fade_out: bool = True,
                      gravity_effect: float = 1.0):
-        for _ in range(count):
-            angle = random.uniform(0, math.pi * 2)
-            velocity = random.uniform(0.5, 1.5) * speed
-            vx = math.cos(angle) * velocity
-            vy = math.sin(angle) * velocity
-
-            self.particles.append(
-                Particle(
-                    x=x, y=y,
-                    vx=vx, vy=vy,
-                    color=color,
-                    size=random.uniform(size * 0.5, size * 1.5),
-                    lifetime=lifetime * random.uniform(0.7, 1.3),
-                    fade_out=fade_out,
-                    gravity_effect=gravity_effect))
+        priority, scale = self.emission
+        if scale < 1.0:
+            # Дробная часть округляется случайно, чтобы одиночные частицы
+            # редели, а не пропадали разом
+            count = int(count * scale + self.effect_rng.random())
+            lifetime *= 0.5 + 0.5 * scale
+        if self.budget is not None and self.count + count > self.budget:
+            free = self.budget - self.count
+            free += self._evict(priority, count - free)
+            count = min(count, free)
+        if count <= 0:
+            return 0
+        self._reserve(count)
+        rng = self.rng
+        angle = rng.uniform(0, math.pi * 2, count)
+        velocity = rng.uniform(0.5, 1.5, count) * speed
+
+        s = slice(self.count, self.count + count)
+        self.x[s] = x
+        self.y[s] = y
+        self.vx[s] = np.cos(angle) * velocity
+        self.vy[s] = np.sin(angle) * velocity
+        self.age[s] = 0.0
+        self.lifetime[s] = lifetime * rng.uniform(0.7, 1.3, count)
+        self.size[s] = rng.uniform(size * 0.5, size * 1.5, count)
+        self.color[s] = color[:3]
+        self.gravity_effect[s] = gravity_effect
+        self.fade_out[s] = fade_out
+        self.priority[s] = priority
+        self.count += count
+        return count
 
     def create_coin_effect(self, x: float, y: float):
         colors = [
             (255, 215, 0),
             (255, 255, 100),
             (255, 200, 50),]
-        color = random.choice(colors)
+        color = self.effect_rng.choice(colors)
         self.add_particle(
             x, y,
             color=color,
@@ -92,15 +247,15 @@ class ParticleSystem:
             (120, 120, 150),
             (180, 180, 200),]
         for i in range(3):
-            offset = random.uniform(-15, 15)
+            offset = self.effect_rng.uniform(-15, 15)
             color = colors[i % len(colors)]
             self.add_particle(
                 x + offset, y - PLAYER_SIZE / 2,
                 color=color,
-                count=random.randint(2, 4),
-                speed=random.uniform(1.0, 2.0),
-                size=random.uniform(2.0, 4.0),
-                lifetime=random.uniform(0.3, 0.6),
+                count=self.effect_rng.randint(2, 4),
+                speed=self.effect_rng.uniform(1.0, 2.0),
+                size=self.effect_rng.uniform(2.0, 4.0),
+                lifetime=self.effect_rng.uniform(0.3, 0.6),
                 gravity_effect=0.3)
 
     def create_landing_effect(self, x: float, y: float):
@@ -109,15 +264,15 @@ class ParticleSystem:
             (120, 120, 150),
             (180, 180, 200),]
         for i in range(5):
-            offset = random.uniform(-20, 20)
+            offset = self.effect_rng.uniform(-20, 20)
             color = colors[i % len(colors)]
             self.add_particle(
                 x + offset, y - PLAYER_SIZE / 2,
                 color=color,
-                count=random.randint(3, 6),
-                speed=random.uniform(1.5, 3.0),
-                size=random.uniform(3.0, 6.0),
-                lifetime=random.uniform(0.4, 0.8),
+                count=self.effect_rng.randint(3, 6),
+                speed=self.effect_rng.uniform(1.5, 3.0),
+                size=self.effect_rng.uniform(3.0, 6.0),
+                lifetime=self.effect_rng.uniform(0.4, 0.8),
                 gravity_effect=0.8)
 
     def create_enemy_hit_effect(self, x: float, y: float):
@@ -125,14 +280,14 @@ class ParticleSystem:
             (255, 100, 100),
             (255, 150, 100),
             (255, 100, 150),]
-        color = random.choice(colors)
+        color = self.effect_rng.choice(colors)
         self.add_particle(
             x, y,
             color=color,
-            count=random.randint(8, 15),
-            speed=random.uniform(2.0, 4.0),
-            size=random.uniform(3.0, 5.0),
-            lifetime=random.uniform(0.5, 0.9),
+            count=self.effect_rng.randint(8, 15),
+            speed=self.effect_rng.uniform(2.0, 4.0),
+            size=self.effect_rng.uniform(3.0, 5.0),
+            lifetime=self.effect_rng.uniform(0.5, 0.9),
             fade_out=True,
             gravity_effect=0.7)
 
@@ -141,14 +296,14 @@ class ParticleSystem:
             (255, 140, 0),
             (255, 100, 50),
             (255, 180, 50),]
-        color = random.choice(colors)
+        color = self.effect_rng.choice(colors)
         self.add_particle(
             x, y,
             color=color,
-            count=random.randint(10, 20),
-            speed=random.uniform(3.0, 6.0),
-            size=random.uniform(2.0, 4.0),
-            lifetime=random.uniform(0.6, 1.0),
+            count=self.effect_rng.randint(10, 20),
+            speed=self.effect_rng.uniform(3.0, 6.0),
+            size=self.effect_rng.uniform(2.0, 4.0),
+            lifetime=self.effect_rng.uniform(0.6, 1.0),
             fade_out=True,
             gravity_effect=0.6)
 
@@ -157,15 +312,15 @@ class ParticleSystem:
             (255, 255, 255, 200),
             (200, 220, 255, 180),
             (255, 255, 200, 150),]
-        if random.random() < 0.3:
-            color = random.choice(colors)
+        if self.effect_rng.random() < 0.3:
+            color = self.effect_rng.choice(colors)
             self.add_particle(
                 x, y,
                 color=color[:3],
                 count=1,
-                speed=random.uniform(0.1, 0.5),
-                size=random.uniform(1.0, 2.0),
-                lifetime=random.uniform(0.5, 1.5),
+                speed=self.effect_rng.uniform(0.1, 0.5),
+                size=self.effect_rng.uniform(1.0, 2.0),
+                lifetime=self.effect_rng.uniform(0.5, 1.5),
                 fade_out=True,
                 gravity_effect=0.1)
 
@@ -178,72 +333,419 @@ class ParticleSystem:
         for i in range(20):
             angle = (i / 20) * math.pi * 2
             color = colors[i % len(colors)]
-            self.add_particle(
-                x, y,
-                color=color,
-                count=1,
-                speed=random.uniform(2.0, 5.0),
-                size=random.uniform(4.0, 8.0),
-                lifetime=random.uniform(1.0, 2.0),
-                fade_out=True,
-                gravity_effect=0.0)
-            self.particles[-1].vx = math.cos(angle) * random.uniform(2.0, 5.0)
-            self.particles[-1].vy = math.sin(angle) * random.uniform(2.0, 5.0)
-
-    def update(self, delta_time: float):
-        particles_to_remove = []
-        for particle in self.particles:
-            particle.age += delta_time
-            if particle.age >= particle.lifetime:
-                particles_to_remove.append(particle)
+            if not self.add_particle(
+                    x, y,
+                    color=color,
+                    count=1,
+                    speed=self.effect_rng.uniform(2.0, 5.0),
+                    size=self.effect_rng.uniform(4.0, 8.0),
+                    lifetime=self.effect_rng.uniform(1.0, 2.0),
+                    fade_out=True,
+                    gravity_effect=0.0):
                 continue
+            self.vx[self.count - 1] = math.cos(angle) * self.effect_rng.uniform(2.0, 5.0)
+            self.vy[self.count - 1] = math.sin(angle) * self.effect_rng.uniform(2.0, 5.0)
 
-            particle.vy -= GRAVITY * particle.gravity_effect * delta_time * 60
-            particle.x += particle.vx * delta_time * 60
-            particle.y += particle.vy * delta_time * 60
+    def create_life_restored_effect(self, x: float, y: float):
+        self.add_particle(
+            x, y,
+            color=(100, 255, 100),
+            count=15,
+            speed=2.0,
+            size=4.0,
+            lifetime=1.0,
+            fade_out=True,
+            gravity_effect=0.3)
+
+    def update(self, delta_time: float):
+        self.clock += delta_time
+        n = self.count
+        if n == 0:
+            return
+        age = self.age[:n]
+        age += delta_time
+        self._remove(age >= self.lifetime[:n])
+        n = self.count
 
-        for particle in particles_to_remove:
-            if particle in self.particles:
-                self.particles.remove(particle)
+        step = delta_time * 60
+        vy = self.vy[:n]
+        vy -= GRAVITY * step * self.gravity_effect[:n]
+        self.x[:n] += self.vx[:n] * step
+        self.y[:n] += vy * step
 
     def draw(self):
-        for particle in self.particles:
-            alpha = 255
-            if particle.fade_out:
-                life_ratio = 1.0 - (particle.age / particle.lifetime)
-                alpha = int(255 * life_ratio)
+        n = self.count
+        if n == 0:
+            return
+        renderer = ParticleRenderer.shared()
+        instances = renderer.reserve(n)
+        instances["position"][:, 0] = self.x[:n]
+        instances["position"][:, 1] = self.y[:n]
+        instances["radius"] = self.size[:n]
+        color = instances["color"]
+        color[:, :3] = self.color[:n]
+        alpha = np.full(n, 255.0, dtype=np.float32)
+        fading = self.fade_out[:n]
+        alpha[fading] = 255 * (1.0 - self.age[:n][fading] / self.lifetime[:n][fading])
+        color[:, 3] = np.clip(alpha, 0, 255)
+        renderer.draw(n)
+
+
+class ParticleRenderer:
+    # Все живые частицы рисуются одним инстансированным вызовом:
+    # общий квад + буфер (позиция, радиус, RGBA) на каждую частицу.
+    INSTANCE_DTYPE = np.dtype([
+        ("position", np.float32, 2),
+        ("radius", np.float32),
+        ("color", np.uint8, 4)])
+
+    VERTEX_SHADER = """
+        #version 330
+
+        uniform WindowBlock {
+            mat4 projection;
+            mat4 view;
+        } window;
+
+        in vec2 in_vert;
+        in vec2 in_position;
+        in float in_radius;
+        in vec4 in_color;
+
+        out vec2 v_offset;
+        out vec4 v_color;
+
+        void main() {
+            v_offset = in_vert;
+            v_color = in_color;
+            vec2 position = in_position + in_vert * in_radius;
+            gl_Position = window.projection * window.view * vec4(position, 0.0, 1.0);
+        }
+    """
+
+    FRAGMENT_SHADER = """
+        #version 330
+
+        in vec2 v_offset;
+        in vec4 v_color;
+
+        out vec4 f_color;
+
+        void main() {
+            if (dot(v_offset, v_offset) > 1.0) {
+                discard;
+            }
+            f_color = v_color;
+        }
+    """
+
+    _shared = None
+
+    @classmethod
+    def shared(cls):
+        ctx = arcade.get_window().ctx
+        if cls._shared is None or cls._shared.ctx is not ctx:
+            cls._shared = cls(ctx)
+        return cls._shared
+
+    def __init__(self, ctx, capacity: int = ParticleSystem.INITIAL_CAPACITY):
+        self.ctx = ctx
+        self.program = ctx.program(
+            vertex_shader=self.VERTEX_SHADER,
+            fragment_shader=self.FRAGMENT_SHADER)
+        quad = np.array([-1, -1, 1, -1, -1, 1, 1, 1], dtype=np.float32)
+        self.quad_buffer = ctx.buffer(data=quad)
+        self.capacity = capacity
+        self.instances = np.zeros(capacity, dtype=self.INSTANCE_DTYPE)
+        self.instance_buffer = ctx.buffer(
+            reserve=capacity * self.INSTANCE_DTYPE.itemsize,
+            usage="stream")
+        self.geometry = ctx.geometry(
+            [arcade.gl.BufferDescription(self.quad_buffer, "2f", ["in_vert"]),
+             arcade.gl.BufferDescription(
+                 self.instance_buffer, "2f 1f 4f1",
+                 ["in_position", "in_radius", "in_color"],
+                 instanced=True)],
+            mode=ctx.TRIANGLE_STRIP)
+
+    def reserve(self, count: int):
+        if count > self.capacity:
+            capacity = self.capacity
+            while capacity < count:
+                capacity *= 2
+            self.capacity = capacity
+            self.instances = np.zeros(capacity, dtype=self.INSTANCE_DTYPE)
+            self.instance_buffer.orphan(size=capacity * self.INSTANCE_DTYPE.itemsize)
+        return self.instances[:count]
+
+    def draw(self, count: int):
+        self.instance_buffer.write(self.instances[:count])
+        with self.ctx.enabled(self.ctx.BLEND):
+            self.geometry.render(self.program, instances=count)
+
+
+class HazardRenderer:
+    # Все шипы уровня рисуются одним списком треугольников. Форма звезды
+    # и ядра хранится один раз в единичном масштабе; на кадре вершины всех
+    # шипов получаются одним поворотом и масштабированием шаблона.
+    VERTEX_DTYPE = np.dtype([
+        ("position", np.float32, 2),
+        ("color", np.uint8, 4)])
+    CORE_SEGMENTS = 16
+    CORE_COLOR = (200, 80, 0, 255)
+
+    VERTEX_SHADER = """
+        #version 330
+
+        uniform WindowBlock {
+            mat4 projection;
+            mat4 view;
+        } window;
+
+        in vec2 in_position;
+        in vec4 in_color;
+
+        out vec4 v_color;
+
+        void main() {
+            v_color = in_color;
+            gl_Position = window.projection * window.view * vec4(in_position, 0.0, 1.0);
+        }
+    """
+
+    FRAGMENT_SHADER = """
+        #version 330
+
+        in vec4 v_color;
+
+        out vec4 f_color;
+
+        void main() {
+            f_color = v_color;
+        }
+    """
+
+    _shared = None
+
+    @classmethod
+    def shared(cls):
+        ctx = arcade.get_window().ctx
+        if cls._shared is None or cls._shared.ctx is not ctx:
+            cls._shared = cls(ctx)
+        return cls._shared
+
+    @classmethod
+    def fan(cls, points):
+        # Веер треугольников из центра (0, 0) по контуру points
+        center = np.zeros_like(points)
+        following = np.roll(points, -1, axis=0)
+        return np.stack((center, points, following), axis=1).reshape(-1, 2)
+
+    def __init__(self, ctx, capacity: int = 64):
+        self.ctx = ctx
+        self.program = ctx.program(
+            vertex_shader=self.VERTEX_SHADER,
+            fragment_shader=self.FRAGMENT_SHADER)
+
+        # Звезда: шесть вершин через 60°, чётные на радиусе 1, нечётные на 0.5
+        angles = np.arange(6) * math.pi / 3
+        radii = np.array([1.0, 0.5] * 3)
+        star = np.column_stack((np.cos(angles) * radii, np.sin(angles) * radii))
+        self.star = self.fan(star)
+        angles = np.arange(self.CORE_SEGMENTS) * 2 * math.pi / self.CORE_SEGMENTS
+        self.core = self.fan(np.column_stack((np.cos(angles), np.sin(angles))) * 0.3)
+        self.vertices_per_hazard = len(self.star) + len(self.core)
+        colors = np.empty((self.vertices_per_hazard, 4), dtype=np.uint8)
+        colors[:len(self.star)] = (*HAZARD_COLOR, 255)
+        colors[len(self.star):] = self.CORE_COLOR
+        self.colors = colors
+
+        self.capacity = capacity
+        self.vertices = np.zeros((capacity, self.vertices_per_hazard), dtype=self.VERTEX_DTYPE)
+        self.vertices["color"] = self.colors
+        self.buffer = ctx.buffer(
+            reserve=self.vertices.nbytes,
+            usage="stream")
+        self.geometry = ctx.geometry(
+            [arcade.gl.BufferDescription(self.buffer, "2f 4f1", ["in_position", "in_color"])],
+            mode=ctx.TRIANGLES)
+
+    def reserve(self, count: int):
+        if count > self.capacity:
+            capacity = self.capacity
+            while capacity < count:
+                capacity *= 2
+            self.capacity = capacity
+            self.vertices = np.zeros((capacity, self.vertices_per_hazard), dtype=self.VERTEX_DTYPE)
+            self.vertices["color"] = self.colors
+            self.buffer.orphan(size=self.vertices.nbytes)
+        return self.vertices[:count]
+
+    def draw(self, hazards, index=slice(None)):
+        # index — какие шипы рисовать (по умолчанию все)
+        x = hazards.x[index][:, None]
+        y = hazards.y[index][:, None]
+        count = len(x)
+        if count == 0:
+            return
+        vertices = self.reserve(count)
+        rotation = hazards.rotation[index]
+        scale = HAZARD_HEIGHT * (np.sin(hazards.pulse[index]) * 0.2 + 0.8)
+        cos = (np.cos(rotation) * scale)[:, None]
+        sin = (np.sin(rotation) * scale)[:, None]
+        star_x, star_y = self.star[:, 0], self.star[:, 1]
+        position = vertices["position"]
+        star_count = len(self.star)
+        position[:, :star_count, 0] = x + cos * star_x - sin * star_y
+        position[:, :star_count, 1] = y + sin * star_x + cos * star_y
+        # Ядро не пульсирует и не вращается
+        position[:, star_count:, 0] = x + self.core[:, 0] * HAZARD_HEIGHT
+        position[:, star_count:, 1] = y + self.core[:, 1] * HAZARD_HEIGHT
+
+        self.buffer.write(vertices)
+        self.geometry.render(self.program, vertices=count * self.vertices_per_hazard)
+
+
+class SpriteTextures:
+    # Составные фигуры игрока, врага и монеты растеризуются один раз во
+    # внеэкранный буфер и хранятся как PNG в SPRITE_CACHE_DIR между
+    # запусками. После изменения рисунка нужно поднять VERSION.
+    VERSION = 1
+    SIZES = {"player": 64, "enemy": 48, "coin": 48, "coin_plain": 48}
+    _textures = {}
 
-            color_with_alpha = (*particle.color, alpha)
-            arcade.draw_circle_filled(
-                particle.x, particle.y,
-                particle.size,
-                color_with_alpha)
+    @staticmethod
+    def draw_player(x, y):
+        arcade.draw_lrbt_rectangle_filled(
+            x - PLAYER_SIZE / 2,
+            x + PLAYER_SIZE / 2,
+            y - PLAYER_SIZE / 2,
+            y + PLAYER_SIZE / 2,
+            PLAYER_COLOR)
+
+        arcade.draw_circle_filled(x, y + PLAYER_SIZE * 0.3,
+                                  PLAYER_SIZE * 0.4, (50, 100, 200))
+        arcade.draw_circle_filled(x + 8, y + PLAYER_SIZE * 0.3 + 5,
+                                  5, arcade.color.WHITE)
+        arcade.draw_circle_filled(x - 8, y + PLAYER_SIZE * 0.3 + 5,
+                                  5, arcade.color.WHITE)
+        arcade.draw_circle_filled(x + 8, y + PLAYER_SIZE * 0.3 + 5,
+                                  2, arcade.color.BLACK)
+        arcade.draw_circle_filled(x - 8, y + PLAYER_SIZE * 0.3 + 5,
+                                  2, arcade.color.BLACK)
+        arcade.draw_arc_outline(
+            x,
+            y + PLAYER_SIZE * 0.3 - 8,
+            10, 6,
+            arcade.color.BLACK, 0, 180, 2)
+
+    @staticmethod
+    def draw_enemy(x, y):
+        # Глаза смотрят вправо; влево — отражённая текстура
+        eye_direction = 1
+        arcade.draw_circle_filled(x, y, ENEMY_SIZE / 2, ENEMY_COLOR)
+        arcade.draw_circle_filled(x + 10 * eye_direction, y + 8, 8, arcade.color.WHITE)
+        arcade.draw_circle_filled(x - 10 * eye_direction, y + 8, 8, arcade.color.WHITE)
+        arcade.draw_circle_filled(x + 10 * eye_direction, y + 8, 4, arcade.color.BLACK)
+        arcade.draw_circle_filled(x - 10 * eye_direction, y + 8, 4, arcade.color.BLACK)
+
+        arcade.draw_arc_outline(x, y - 5, 15, 10, arcade.color.BLACK, 0, 180, 3)
+
+    @staticmethod
+    def draw_coin(x, y):
+        # Блик нарисован при rotation = 0; поворот монеты — это угол спрайта
+        arcade.draw_circle_filled(x, y, COIN_SIZE, COIN_COLOR)
+        arcade.draw_circle_filled(x, y, COIN_SIZE * 0.7, (255, 235, 100))
+        arcade.draw_circle_filled(x + COIN_SIZE * 0.4, y, COIN_SIZE * 0.3, (255, 255, 255, 200))
+        arcade.draw_circle_outline(x, y, COIN_SIZE, (200, 170, 0), 2)
+
+    @staticmethod
+    def draw_coin_plain(x, y):
+        # Монета без блика и обводки для низких ступеней качества
+        arcade.draw_circle_filled(x, y, COIN_SIZE, COIN_COLOR)
+        arcade.draw_circle_filled(x, y, COIN_SIZE * 0.7, (255, 235, 100))
+
+    @classmethod
+    def get(cls, name):
+        if name not in cls._textures:
+            cls._textures[name] = cls.load(name)
+        return cls._textures[name]
+
+    @classmethod
+    def load(cls, name):
+        key = f"{name}_v{cls.VERSION}"
+        path = os.path.join(SPRITE_CACHE_DIR, f"{key}.png")
+        try:
+            image = Image.open(path)
+            image.load()
+        except OSError:
+            image = cls.rasterize(name)
+            try:
+                os.makedirs(SPRITE_CACHE_DIR, exist_ok=True)
+                image.save(path)
+            except OSError:
+                # Без кэша просто растеризуем заново при следующем запуске
+                pass
+        return arcade.Texture(image, hash=key)
+
+    @classmethod
+    def rasterize(cls, name):
+        ctx = arcade.get_window().ctx
+        size = cls.SIZES[name]
+        framebuffer = ctx.framebuffer(color_attachments=[ctx.texture((size, size), components=4)])
+        camera = arcade.camera.Camera2D(
+            viewport=arcade.LBWH(0, 0, size, size),
+            projection=arcade.LRBT(-size / 2, size / 2, -size / 2, size / 2),
+            position=(0, 0),
+            render_target=framebuffer)
+        blend_func = ctx.blend_func
+        # Альфа складывается отдельно, иначе полупрозрачный блик
+        # «просверлит» непрозрачную монету под собой
+        ctx.blend_func = ctx.SRC_ALPHA, ctx.ONE_MINUS_SRC_ALPHA, ctx.ONE, ctx.ONE_MINUS_SRC_ALPHA
+        try:
+            with camera.activate():
+                framebuffer.clear(color=(0, 0, 0, 0))
+                getattr(cls, f"draw_{name}")(0, 0)
+            data = framebuffer.read(components=4)
+        finally:
+            ctx.blend_func = blend_func
+        image = Image.frombytes("RGBA", (size, size), data)
+        return image.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
 
 
 class SaveSystem:
     @staticmethod
-    def load_game_data():
-        default_data = {
+    def default_game_data():
+        return {
             "max_level_reached": 1,
             "level_records": {
-                1: 0,
-                2: 0,
-                3: 0,
-                4: 0,
-                5: 0},
+                "1": 0,
+                "2": 0,
+                "3": 0,
+                "4": 0,
+                "5": 0},
             "total_score": 0,
             "total_coins": 0,
             "games_played": 0,
-            "games_won": 0}
+            "games_won": 0,
+            # "auto" или имя закреплённой ступени QUALITY_TIERS
+            "quality": "auto"}
+
+    @staticmethod
+    def load_game_data(path=SAVE_FILE):
+        default_data = SaveSystem.default_game_data()
 
         try:
-            if os.path.exists(SAVE_FILE):
-                with open(SAVE_FILE, 'r', encoding='utf-8') as f:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     # Объединяем с дефолтными значениями
                     for key, value in default_data.items():
                         if key not in data:
                             data[key] = value
+                    data["level_records"] = {
+                        str(level): record
+                        for level, record in data["level_records"].items()}
                     return data
             else:
                 return default_data
@@ -252,178 +754,2258 @@ class SaveSystem:
             return default_data
 
     @staticmethod
-    def save_game_data(data):
+    def save_game_data(data, path=SAVE_FILE):
+        # Пишем во временный файл рядом и атомарно подменяем сохранение,
+        # чтобы прерванная запись не оставила битый JSON
+        directory = os.path.dirname(os.path.abspath(path))
+        temp_path = None
         try:
-            with open(SAVE_FILE, 'w', encoding='utf-8') as f:
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory,
+                                             prefix=".save-", suffix=".tmp",
+                                             delete=False) as f:
+                temp_path = f.name
                 json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
             return True
         except Exception as e:
             print(f"Ошибка сохранения: {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
             return False
 
+
+@dataclass(frozen=True)
+class LevelStats:
+    level: int
+    runs: int
+    leaders: Tuple[int, ...]
+    # Перцентиль → счёт, ниже которого остальные забеги
+    percentiles: dict
+
+
+class RunHistory:
+    # Журнал забегов в SQLite (WAL). Строки только добавляются; число
+    # забегов по уровню ведёт триггер, лидеры и перцентили берутся по индексу
+    # (level, score), поэтому запросы не растут вместе с историей.
+    SCHEMA_VERSION = 1
+    LEADERS = 3
+    PERCENTILES = (50, 90)
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            level INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            coins INTEGER,
+            time_left REAL,
+            lives INTEGER,
+            completed INTEGER,
+            finished_at REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS runs_by_score ON runs (level, score);
+        CREATE TABLE IF NOT EXISTS level_totals (
+            level INTEGER PRIMARY KEY,
+            runs INTEGER NOT NULL);
+        CREATE TRIGGER IF NOT EXISTS runs_counted AFTER INSERT ON runs BEGIN
+            INSERT INTO level_totals (level, runs) VALUES (NEW.level, 1)
+                ON CONFLICT (level) DO UPDATE SET runs = runs + 1;
+        END;
+    """
+    INSERT = """
+        INSERT INTO runs (level, score, coins, time_left, lives, completed, finished_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Пишет фоновый поток сохранения (под замком), читает меню — через
+        # своё соединение: в режиме WAL чтение не ждёт записи
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.reader = None
+        try:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(self.SCHEMA)
+            self.reader = sqlite3.connect(path, check_same_thread=False,
+                                          isolation_level=None)
+        except sqlite3.Error:
+            self.connection.close()
+            raise
+
+    def migrate(self, data, finished_at):
+        # В game_save.json отдельных забегов нет, переносятся только рекорды
+        # уровней; монеты, время и жизни у таких строк пустые
+        with self._lock, self.connection:
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if version >= self.SCHEMA_VERSION:
+                return
+            rows = [(int(level), score, None, None, None, None, finished_at)
+                    for level, score in data["level_records"].items() if score > 0]
+            self.connection.executemany(self.INSERT, rows)
+            self.connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def append(self, runs):
+        with self._lock, self.connection:
+            self.connection.executemany(self.INSERT, runs)
+
+    def level_stats(self, level):
+        execute = self.reader.execute
+        # Все выборки — из одного снимка базы
+        execute("BEGIN")
+        try:
+            row = execute("SELECT runs FROM level_totals WHERE level = ?", (level,)).fetchone()
+            runs = row[0] if row else 0
+            leaders = tuple(score for score, in execute(
+                "SELECT score FROM runs WHERE level = ? ORDER BY score DESC LIMIT ?",
+                (level, self.LEADERS)))
+            percentiles = {}
+            for percentile in self.PERCENTILES if runs else ():
+                # OFFSET проходит индекс по порядку, поэтому идём с ближнего конца
+                rank = (runs - 1) * percentile // 100
+                if rank <= (runs - 1) // 2:
+                    order, offset = "ASC", rank
+                else:
+                    order, offset = "DESC", runs - 1 - rank
+                percentiles[percentile] = execute(
+                    f"SELECT score FROM runs WHERE level = ? ORDER BY score {order} "
+                    "LIMIT 1 OFFSET ?", (level, offset)).fetchone()[0]
+        finally:
+            execute("COMMIT")
+        return LevelStats(level, runs, leaders, percentiles)
+
+    def close(self):
+        self.reader.close()
+        with self._lock:
+            self.connection.close()
+
+
+class SaveRepository:
+    # Одно хранилище на процесс: данные живут в памяти, изменения помечаются
+    # грязными, а на диск их сбрасывает фоновый поток.
+    _instance = None
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, path=SAVE_FILE):
+        self.path = path
+        self.data = SaveSystem.load_game_data(path)
+        self.history = None
+        try:
+            self.history = RunHistory(os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                   HISTORY_FILE))
+            self.history.migrate(self.data, os.path.getmtime(path) if os.path.exists(path)
+                                 else time.time())
+        except sqlite3.Error as e:
+            # Без журнала игра идёт дальше, только статистика забегов пустая
+            print(f"Ошибка открытия журнала забегов: {e}")
+            if self.history is not None:
+                self.history.close()
+                self.history = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        # Забеги, ещё не добавленные в журнал
+        self._runs = []
+        # Растёт при каждом изменении data: по нему представления узнают,
+        # что закэшированную картинку пора перерисовать
+        self.revision = 0
+        # Растёт, когда фоновый поток дописал забеги в журнал
+        self.history_revision = 0
+        self._closing = False
+        self._wake = threading.Event()
+        self._writer = threading.Thread(target=self._write_behind,
+                                        name="save-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record_run(self, level, score, coins_collected, time_left=None, lives=None,
+                   completed=None):
+        with self._lock:
+            self._runs.append((level, score, coins_collected, time_left, lives,
+                               completed, time.time()))
+            data = self.data
+            if level > data["max_level_reached"]:
+                data["max_level_reached"] = level
+            if score > data["level_records"].get(str(level), 0):
+                data["level_records"][str(level)] = score
+            data["total_score"] += score
+            data["total_coins"] += coins_collected
+            data["games_played"] += 1
+            if level == 5:
+                data["games_won"] += 1
+            self._mark_dirty()
+        return self.data
+
+    def set_quality(self, setting):
+        with self._lock:
+            self.data["quality"] = setting
+            self._mark_dirty()
+
+    def level_stats(self, level):
+        # Только уже записанные забеги: запись идёт в фоновом потоке, и меню
+        # перерисуется по history_revision, когда он её закончит
+        if self.history is not None:
+            try:
+                return self.history.level_stats(level)
+            except sqlite3.Error as e:
+                print(f"Ошибка чтения журнала забегов: {e}")
+        return LevelStats(level, 0, (), {})
+
+    def reset(self):
+        # Журнал забегов сброс не трогает: он только пополняется
+        with self._lock:
+            # Меняем словарь на месте: представления держат ссылку на него
+            self.data.clear()
+            self.data.update(SaveSystem.default_game_data())
+            self._mark_dirty()
+        return self.data
+
+    def _mark_dirty(self):
+        self._dirty = True
+        self.revision += 1
+        self._wake.set()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = json.loads(json.dumps(self.data))
+                runs, self._runs = self._runs, []
+                self._dirty = False
+            if runs and self.history is not None:
+                try:
+                    self.history.append(runs)
+                    self.history_revision += 1
+                except sqlite3.Error as e:
+                    print(f"Ошибка записи журнала забегов: {e}")
+            SaveSystem.save_game_data(snapshot, self.path)
+
+    def _write_behind(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
+            if self._closing:
+                return
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._wake.set()
+        self._writer.join(timeout=5.0)
+        self.flush()
+        if self.history is not None:
+            self.history.close()
+
+
+class TextCache:
+    # Надписи создаются один раз на представление. Статичные лежат в общем
+    # батче, у динамических текст и цвет меняются только при смене значения.
+    def __init__(self):
+        self.static_batch = pyglet.graphics.Batch()
+        self.dynamic_batch = pyglet.graphics.Batch()
+        self.labels = {}
+
+    def add(self, key, text, x, y, color, font_size, static=True, **kwargs):
+        batch = self.static_batch if static else self.dynamic_batch
+        label = arcade.Text(text, x, y, color, font_size, batch=batch, **kwargs)
+        self.labels[key] = label
+        return label
+
+    def update(self, key, text=None, color=None, visible=None):
+        label = self.labels[key]
+        if text is not None and label.text != text:
+            label.text = text
+        if color is not None:
+            color = arcade.types.Color.from_iterable(color)
+            if label.color != color:
+                label.color = color
+        if visible is not None and label.visible != visible:
+            label.visible = visible
+
+    def draw(self):
+        self.static_batch.draw()
+        self.dynamic_batch.draw()
+
+
+class FrameProfiler:
+    # Скользящие замеры фаз кадра. Пока оверлей выключен, begin/end
+    # возвращаются сразу и ничего не пишут.
+    HISTORY = 240
+    REFRESH_INTERVAL = 0.25
+    PANEL_WIDTH = 360
+    LINE_HEIGHT = 16
+    GRAPH_HEIGHT = 60
+    GRAPH_MAX_MS = 50.0
+
+    def __init__(self):
+        self.enabled = False
+        self.history = {}
+        self.frame_times = deque(maxlen=self.HISTORY)
+        self.counters = {}
+        self._pending = {}
+        self._starts = {}
+        self._last_frame = None
+        self._last_refresh = 0.0
+        self.text = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.reset()
+
+    def reset(self):
+        self.history.clear()
+        self.frame_times.clear()
+        self.counters.clear()
+        self._pending.clear()
+        self._starts.clear()
+        self._last_frame = None
+
+    def begin(self, phase):
+        if not self.enabled:
+            return
+        self._starts[phase] = time.perf_counter()
+
+    def end(self, phase):
+        if not self.enabled:
+            return
+        started = self._starts.pop(phase, None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            self._pending[phase] = self._pending.get(phase, 0.0) + elapsed
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counters[name] = value
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        # Фаза могла выполниться несколько раз за кадр (несколько тиков) —
+        # в историю идёт сумма за кадр
+        for phase, elapsed in self._pending.items():
+            if phase not in self.history:
+                self.history[phase] = deque(maxlen=self.HISTORY)
+            self.history[phase].append(elapsed * 1000)
+        self._pending.clear()
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self.frame_times.append((now - self._last_frame) * 1000)
+        self._last_frame = now
+
     @staticmethod
-    def update_level_record(level, score, coins_collected):
-        data = SaveSystem.load_game_data()
-        if level > data["max_level_reached"]:
-            data["max_level_reached"] = level
-        if score > data["level_records"].get(str(level), 0):
-            data["level_records"][str(level)] = score
-        data["total_score"] += score
-        data["total_coins"] += coins_collected
-        data["games_played"] += 1
-        if level == 5:
-            data["games_won"] += 1
-        SaveSystem.save_game_data(data)
-        return data
+    def percentiles(samples):
+        p50, p95, p99 = np.percentile(np.fromiter(samples, float, len(samples)), (50, 95, 99))
+        return p50, p95, p99
+
+    def lines(self):
+        lines = ["фаза                    p50    p95    p99 мс"]
+        if self.frame_times:
+            p50, p95, p99 = self.percentiles(self.frame_times)
+            lines.append(f"{'кадр':20} {p50:6.2f} {p95:6.2f} {p99:6.2f}")
+        for phase, samples in self.history.items():
+            p50, p95, p99 = self.percentiles(samples)
+            lines.append(f"{phase:20} {p50:6.2f} {p95:6.2f} {p99:6.2f}")
+        for name, value in self.counters.items():
+            lines.append(f"{name}: {value}")
+        return lines
+
+    def draw(self):
+        if not self.enabled:
+            return
+        if self.text is None:
+            self.text = TextCache()
+        lines = self.lines()
+        left = 10
+        top = SCREEN_HEIGHT - 80
+        bottom = top - len(lines) * self.LINE_HEIGHT - self.GRAPH_HEIGHT - 20
+        arcade.draw_lrbt_rectangle_filled(
+            left, left + self.PANEL_WIDTH, bottom, top,
+            (0, 0, 0, 200))
+
+        # Цифры обновляем несколько раз в секунду, иначе их не прочитать
+        # и разметка текста сама станет заметной фазой
+        now = time.perf_counter()
+        refresh = now - self._last_refresh > self.REFRESH_INTERVAL
+        if refresh:
+            self._last_refresh = now
+        for i, line in enumerate(lines):
+            key = f"line_{i}"
+            if key not in self.text.labels:
+                self.text.add(key, line,
+                              left + 6, top - (i + 1) * self.LINE_HEIGHT,
+                              (200, 255, 200), 10,
+                              static=False, font_name=("Courier New", "DejaVu Sans Mono"))
+            elif refresh:
+                self.text.update(key, text=line)
+            self.text.update(key, visible=True)
+        for i in range(len(lines), len(self.text.labels)):
+            self.text.update(f"line_{i}", visible=False)
+        self.text.draw()
+
+        # График времени кадра с линией бюджета 60 FPS
+        graph_bottom = bottom + 10
+        graph_left = left + 6
+        scale = self.GRAPH_HEIGHT / self.GRAPH_MAX_MS
+        budget_y = graph_bottom + 1000 / 60 * scale
+        arcade.draw_line(graph_left, budget_y, graph_left + self.HISTORY, budget_y,
+                         (255, 80, 80), 1)
+        if len(self.frame_times) > 1:
+            points = [(graph_left + i, graph_bottom + min(ms, self.GRAPH_MAX_MS) * scale)
+                      for i, ms in enumerate(self.frame_times)]
+            arcade.draw_line_strip(points, (100, 255, 100), 1)
+
+
+PROFILER = FrameProfiler()
+
+
+class StartupProfiler:
+    # Время от старта процесса до первого кадра меню по фазам запуска.
+    # Фазы отмечаются всегда; с --profile-startup после первого кадра
+    # печатается разбивка, а меню закрывает игру.
+    def __init__(self, started):
+        self.started = started
+        self.last = started
+        self.phases = []
+        self.enabled = False
+        self.done = False
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def first_frame(self, window):
+        if self.done:
+            return
+        self.done = True
+        if self.enabled:
+            # Кадр считается готовым, когда GPU его дорисовал
+            window.ctx.finish()
+        self.mark("первый кадр")
+        if self.enabled:
+            self.report()
+
+    def report(self):
+        total = (self.last - self.started) * 1000
+        print(f"Время до первого кадра: {total:.1f} мс")
+        for phase, elapsed in self.phases:
+            print(f"  {phase:14} {elapsed:8.1f} мс")
+
+
+STARTUP = StartupProfiler(STARTUP_STARTED)
+
+
+@dataclass(frozen=True)
+class QualityTier:
+    name: str
+    title: str
+    # Доля фоновых искр, бюджет частиц, сетка фона, блик и обводка монет,
+    # кольцо частиц при прохождении уровня
+    sparkle_rate: float
+    particle_budget: int
+    grid: bool
+    coin_detail: bool
+    celebration: bool
+
+
+QUALITY_TIERS = (
+    QualityTier("high", "высокое", 1.0, PARTICLE_BUDGET, True, True, True),
+    QualityTier("medium", "среднее", 0.5, PARTICLE_BUDGET // 2, True, False, True),
+    QualityTier("low", "низкое", 0.0, PARTICLE_BUDGET // 6, False, False, False))
+
+
+class QualityGovernor:
+    # Ступень качества по измеренному времени кадра. Если p95 за окно из
+    # WINDOW кадров выше DOWNGRADE_MS — ступенью ниже; если ниже UPGRADE_MS
+    # и с прошлого переключения прошло upgrade_hold секунд — ступенью выше.
+    # После переключения окно набирается заново, а подъём, за которым
+    # сразу последовал спуск, удваивает upgrade_hold — так качество не
+    # мечется между двумя ступенями.
+    WINDOW = 90
+    DOWNGRADE_MS = 1000 / 60 * 1.3
+    UPGRADE_MS = 1000 / 60 * 1.1
+    UPGRADE_HOLD = 5.0
+    # Пауза дольше этого (загрузка, свёрнутое окно) — не время кадра
+    MAX_SAMPLE_MS = 250
+
+    def __init__(self):
+        self.level = 0
+        self.pinned = None
+        self.upgrade_hold = self.UPGRADE_HOLD
+        self.samples = deque(maxlen=self.WINDOW)
+        self._last_frame = None
+        self._last_switch = time.perf_counter()
+        self._last_upgrade = None
+
+    @property
+    def tier(self):
+        return QUALITY_TIERS[self.level if self.pinned is None else self.pinned]
+
+    @property
+    def setting(self):
+        return "auto" if self.pinned is None else QUALITY_TIERS[self.pinned].name
+
+    def pin(self, setting):
+        # "auto" — подбирать автоматически, иначе имя ступени
+        names = [tier.name for tier in QUALITY_TIERS]
+        self.pinned = names.index(setting) if setting in names else None
+        self.samples.clear()
+
+    def cycle(self):
+        settings = ["auto"] + [tier.name for tier in QUALITY_TIERS]
+        self.pin(settings[(settings.index(self.setting) + 1) % len(settings)])
+        return self.setting
+
+    def describe(self):
+        mode = "авто" if self.pinned is None else "закреплено"
+        return f"{self.tier.title} ({mode})"
+
+    def reset(self):
+        self.samples.clear()
+        self._last_frame = None
+
+    def end_frame(self):
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self.samples.append(min((now - self._last_frame) * 1000, self.MAX_SAMPLE_MS))
+        self._last_frame = now
+        if self.pinned is None and len(self.samples) == self.WINDOW:
+            self.adjust(now)
+
+    def adjust(self, now):
+        p95 = np.percentile(np.fromiter(self.samples, float, self.WINDOW), 95)
+        if p95 > self.DOWNGRADE_MS and self.level < len(QUALITY_TIERS) - 1:
+            if self._last_upgrade is not None and now - self._last_upgrade < self.upgrade_hold:
+                self.upgrade_hold *= 2
+            self.switch(self.level + 1, now)
+        elif (p95 < self.UPGRADE_MS and self.level > 0 and
+              now - self._last_switch > self.upgrade_hold):
+            self._last_upgrade = now
+            self.switch(self.level - 1, now)
+
+    def switch(self, level, now):
+        self.level = level
+        self._last_switch = now
+        self.samples.clear()
+
+
+QUALITY = QualityGovernor()
+
+
+class CachedLayer:
+    # Внеэкранный буфер размером с окно. Содержимое перерисовывается только
+    # через render(), на кадре draw() кладёт его одной текстурой поверх
+    # уже нарисованного. Цвет в буфере хранится с домноженной альфой.
+    def __init__(self, window):
+        self.ctx = window.ctx
+        width, height = window.get_framebuffer_size()
+        self.texture = self.ctx.texture((width, height), components=4)
+        self.framebuffer = self.ctx.framebuffer(color_attachments=[self.texture])
+        self.quad = arcade.gl.geometry.quad_2d_fs()
+        # Чем владелец пометил нарисованное: по нему решает, перерисовывать ли
+        self.key = None
+
+    def render(self, draw):
+        ctx = self.ctx
+        blend_func = ctx.blend_func
+        ctx.blend_func = ctx.SRC_ALPHA, ctx.ONE_MINUS_SRC_ALPHA, ctx.ONE, ctx.ONE_MINUS_SRC_ALPHA
+        try:
+            # Буфер размером с окно, поэтому проекция окна подходит как есть
+            with self.framebuffer.activate():
+                self.framebuffer.clear(color=(0, 0, 0, 0))
+                draw()
+        finally:
+            ctx.blend_func = blend_func
+
+    def draw(self):
+        ctx = self.ctx
+        blend_func = ctx.blend_func
+        ctx.blend_func = ctx.ONE, ctx.ONE_MINUS_SRC_ALPHA
+        with ctx.enabled(ctx.BLEND):
+            self.texture.use(0)
+            self.quad.render(ctx.utility_textured_quad_program)
+        ctx.blend_func = blend_func
+
+    def save(self, path, key):
+        # Содержимое буфера на диск вместе с ключом, по которому load()
+        # поймёт, что картинка ещё годится. Читать из GPU можно только в
+        # потоке окна, сжатие и запись идут в фоновом
+        pixels = np.frombuffer(self.texture.read(), dtype=np.uint8)
+        writer = threading.Thread(target=self.write_pixels, args=(path, key, pixels),
+                                  name="layer-cache-writer", daemon=True)
+        writer.start()
+        return writer
 
     @staticmethod
-    def reset_save_data():
-        default_data = {
-            "max_level_reached": 1,
-            "level_records": {
-                1: 0,
-                2: 0,
-                3: 0,
-                4: 0,
-                5: 0},
-            "total_score": 0,
-            "total_coins": 0,
-            "games_played": 0,
-            "games_won": 0}
-        SaveSystem.save_game_data(default_data)
-        return default_data
-
-
-LEVELS = {
-    1: {
-        "name": "Начальный",
-        "time": 90,
-        "coins": 5,
-        "enemies": 0,
-        "hazards": 0,
-        "background": (40, 60, 100),
-        "platforms": [
-            [0, 120, 1200, 40],
-            [100, 220, 300, 25],
-            [450, 320, 300, 25],
-            [800, 240, 300, 25],
-            [300, 420, 250, 25],
-            [650, 400, 250, 25]]},
-    2: {
-        "name": "Городской парк",
-        "time": 85,
-        "coins": 8,
-        "enemies": 2,
-        "hazards": 2,
-        "background": (60, 100, 80),
-        "platforms": [
-            [0, 120, 1200, 40],
-            [150, 220, 250, 25],
-            [450, 280, 250, 25],
-            [750, 220, 250, 25],
-            [200, 380, 200, 25],
-            [500, 420, 200, 25],
-            [800, 380, 200, 25]]},
-    3: {
-        "name": "Горный хребет",
-        "time": 80,
-        "coins": 10,
-        "enemies": 3,
-        "hazards": 4,
-        "background": (30, 40, 70),
-        "platforms": [
-            [0, 120, 400, 40],
-            [500, 120, 400, 40],
-            [200, 240, 150, 25],
-            [600, 240, 150, 25],
-            [1000, 240, 150, 25],
-            [350, 360, 120, 25],
-            [750, 360, 120, 25],
-            [150, 480, 100, 25],
-            [450, 480, 100, 25],
-            [800, 480, 100, 25]]},
-    4: {
-        "name": "Заброшенный завод",
-        "time": 70,
-        "coins": 12,
-        "enemies": 4,
-        "hazards": 6,
-        "background": (50, 50, 60),
-        "platforms": [
-            [0, 120, 1200, 40],
-            [50, 200, 150, 20],
-            [300, 200, 150, 20],
-            [550, 200, 150, 20],
-            [800, 200, 150, 20],
-            [250, 350, 200, 20],
-            [500, 400, 200, 20],
-            [750, 350, 200, 20],
-            [150, 500, 80, 15],
-            [450, 550, 80, 15],
-            [750, 500, 80, 15]]},
-    5: {
-        "name": "Космическая станция",
-        "time": 60,
-        "coins": 15,
-        "enemies": 5,
-        "hazards": 8,
-        "background": (10, 10, 40),
-        "platforms": [
-            [0, 120, 300, 30],
-            [450, 120, 300, 30],
-            [900, 120, 300, 30],
-            [50, 250, 120, 20],
-            [300, 350, 120, 20],
-            [550, 280, 120, 20],
-            [800, 400, 120, 20],
-            [1050, 320, 120, 20],
-            [200, 500, 200, 15],
-            [650, 550, 200, 15],]}}
+    def write_pixels(path, key, pixels):
+        directory = os.path.dirname(path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez_compressed(f, key=np.array(key), pixels=pixels)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            pass
+
+    def load(self, path, key):
+        try:
+            with np.load(path, allow_pickle=False) as cache:
+                if str(cache["key"]) != key:
+                    return False
+                pixels = cache["pixels"]
+        except (OSError, KeyError, ValueError):
+            return False
+        width, height = self.texture.size
+        if pixels.size != width * height * 4:
+            return False
+        self.texture.write(pixels)
+        return True
+
+
+class LevelFormatError(ValueError):
+    pass
+
+
+class LevelCatalog(Mapping):
+    # Уровни лежат в каталоге файлами <номер>.json. При создании каталог
+    # только перечисляет файлы; уровень читается при первом обращении.
+    # Проверенный уровень кэшируется рядом с исходником в <номер>.npz и
+    # пересобирается, если исходник изменился.
+    CACHE_VERSION = 1
+    COUNT_FIELDS = ("coins", "enemies", "hazards")
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = {}
+        self.levels = {}
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            names = []
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext == ".json" and stem.isdigit():
+                self.paths[int(stem)] = os.path.join(directory, name)
+
+    def __contains__(self, level_num):
+        return level_num in self.paths
+
+    def __getitem__(self, level_num):
+        if level_num not in self.levels:
+            self.levels[level_num] = self.load(self.paths[level_num])
+        return self.levels[level_num]
+
+    def __iter__(self):
+        return iter(sorted(self.paths))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def signature(self):
+        # Меняется при правке любого файла уровня; годится в ключ кэша,
+        # не загружая сами уровни
+        stats = []
+        for level_num in sorted(self.paths):
+            stat = os.stat(self.paths[level_num])
+            stats.append([level_num, stat.st_mtime_ns, stat.st_size])
+        return stats
+
+    @classmethod
+    def validate(cls, data, path):
+        def check(condition, message):
+            if not condition:
+                raise LevelFormatError(f"{path}: {message}")
+
+        def is_number(value):
+            return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+        check(isinstance(data, dict), "уровень должен быть объектом")
+        check(isinstance(data.get("name"), str), "нет названия (name)")
+        check(is_number(data.get("time")) and data["time"] > 0,
+              "время (time) должно быть положительным числом")
+        for field in cls.COUNT_FIELDS:
+            value = data.get(field)
+            check(isinstance(value, int) and not isinstance(value, bool) and value >= 0,
+                  f"{field} должно быть неотрицательным целым")
+        background = data.get("background", BACKGROUND_COLOR)
+        check(isinstance(background, (list, tuple)) and len(background) == 3 and
+              all(isinstance(c, int) and 0 <= c <= 255 for c in background),
+              "цвет фона (background) — три числа 0..255")
+        width = data.get("width", SCREEN_WIDTH)
+        check(isinstance(width, int) and width >= SCREEN_WIDTH,
+              f"ширина (width) — целое не меньше {SCREEN_WIDTH}")
+        platforms = data.get("platforms")
+        check(isinstance(platforms, list), "нет списка платформ (platforms)")
+        for i, plat in enumerate(platforms):
+            check(isinstance(plat, list) and len(plat) == 4 and all(map(is_number, plat)),
+                  f"платформа {i} должна быть [x, y, ширина, высота]")
+            check(plat[2] > 0 and plat[3] > 0, f"у платформы {i} нулевой размер")
+
+    @classmethod
+    def load(cls, path):
+        stat = os.stat(path)
+        cache_path = os.path.splitext(path)[0] + ".npz"
+        level = cls.load_cache(cache_path, path, stat)
+        if level is None:
+            with open(path, 'rb') as f:
+                source = f.read()
+            level = cls.compile(source, path)
+            cls.save_cache(cache_path, level, stat, hashlib.sha1(source).hexdigest())
+        return level
+
+    @classmethod
+    def compile(cls, source, path):
+        try:
+            data = json.loads(source.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise LevelFormatError(f"{path}: {e}") from e
+        cls.validate(data, path)
+        level = {
+            "name": data["name"],
+            "time": data["time"],
+            "background": tuple(data.get("background", BACKGROUND_COLOR)),
+            "platforms": data["platforms"]}
+        for field in cls.COUNT_FIELDS:
+            level[field] = data[field]
+        if "width" in data:
+            level["width"] = data["width"]
+        return level
+
+    @classmethod
+    def load_cache(cls, cache_path, path, stat):
+        # Кэш годен, если совпадают время изменения и размер исходника; если
+        # нет — сверяем хэш содержимого (файл могли просто «потрогать»)
+        try:
+            with np.load(cache_path, allow_pickle=False) as cache:
+                meta = json.loads(str(cache["meta"]))
+                platforms = cache["platforms"]
+        except (OSError, KeyError, ValueError):
+            return None
+        if meta.get("version") != cls.CACHE_VERSION:
+            return None
+        touched = meta.get("mtime_ns") != stat.st_mtime_ns or meta.get("size") != stat.st_size
+        if touched:
+            with open(path, 'rb') as f:
+                if hashlib.sha1(f.read()).hexdigest() != meta.get("sha1"):
+                    return None
+        level = meta["level"]
+        level["background"] = tuple(level["background"])
+        level["platforms"] = platforms.tolist()
+        if touched:
+            # Содержимое то же — запоминаем новое время, чтобы дальше снова
+            # обходиться без чтения и хэширования исходника
+            cls.save_cache(cache_path, level, stat, meta["sha1"])
+        return level
+
+    @classmethod
+    def save_cache(cls, cache_path, level, stat, sha1):
+        level = dict(level)
+        # Целые координаты остаются целыми, иначе float64
+        platforms = np.asarray(level.pop("platforms")).reshape(-1, 4)
+        meta = {
+            "version": cls.CACHE_VERSION,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha1": sha1,
+            "level": level}
+        directory = os.path.dirname(cache_path) or "."
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                             platforms=platforms)
+                os.replace(tmp_path, cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            # Без кэша уровень просто будет разобран заново в следующий раз
+            pass
+
+
+LEVELS = LevelCatalog(LEVELS_DIR)
+
+
+def _jump_arc():
+    # Скорость и подъём низа игрока после каждого тика прыжка — тем же
+    # счётом, что и в _move_player, пока игрок не упадёт ниже экрана
+    speeds, rises = [], []
+    speed = PLAYER_JUMP_SPEED
+    rise = 0
+    while rise > -SCREEN_HEIGHT:
+        speed -= GRAVITY
+        rise += speed
+        speeds.append(speed)
+        rises.append(rise)
+    return np.array(speeds), np.array(rises)
+
+
+class ReachabilityIndex:
+    # Граф прыжков уровня: на какую платформу можно попасть с какой одним
+    # прыжком. Дуга прыжка считается один раз на всю игру; на подъёме игрок
+    # проходит платформы насквозь, на спуске садится на ту, с которой
+    # пересёкся. Пары платформ проверяются разом матрицами n×n, без перебора
+    # тиков: на спуске высота монотонна, и окно посадки ищется бинарным
+    # поиском. Упор в потолок экрана и заслон другими платформами не учитываются.
+    ARC_SPEED, ARC_RISE = _jump_arc()
+    FALL_START = int(np.argmax(ARC_SPEED <= 0))
+    # Подъём на спуске, взятый с обратным знаком, — по возрастанию для searchsorted
+    FALL_DEPTH = -ARC_RISE[FALL_START:]
+
+    def __init__(self, platforms, world_width=SCREEN_WIDTH, floor=True):
+        plats = np.array(platforms, dtype=np.float64).reshape(-1, 4)
+        self.count = len(plats)
+        if floor:
+            # Пол на первых уровнях — платформа во всю ширину мира с верхом на нуле
+            plats = np.vstack((plats, [[0, -SCREEN_HEIGHT, world_width, SCREEN_HEIGHT]]))
+        radius = PLAYER_SIZE / 2
+        # Где может быть центр стоящего на платформе игрока
+        self.left = plats[:, 0] - radius
+        self.right = plats[:, 0] + plats[:, 2] + radius
+        self.bottom = plats[:, 1]
+        self.top = plats[:, 1] + plats[:, 3]
+
+        gap = np.maximum(np.maximum(self.left[None, :] - self.right[:, None],
+                                    self.left[:, None] - self.right[None, :]), 0)
+        # Окно посадки с платформы i на j: низ игрока уже ниже верха j,
+        # а верх ещё выше её низа
+        first = self.fall_tick(self.top[None, :] - self.top[:, None], 'right')
+        last = self.fall_tick(self.bottom[None, :] - PLAYER_SIZE - self.top[:, None], 'left') - 1
+        self.edges = (first <= last) & (gap < last * PLAYER_MOVE_SPEED)
+        np.fill_diagonal(self.edges, False)
+        # Тик посадки: первый тик окна, на котором игрок успевает долететь по горизонтали
+        self.land_tick = np.where(self.edges,
+                                  np.maximum(first, gap // PLAYER_MOVE_SPEED + 1), 0).astype(int)
+
+        self.start = self.landing(*PLAYER_SPAWN)
+        self.reachable = np.zeros(len(plats), dtype=bool)
+        if self.start >= 0:
+            self.reachable[self.start] = True
+            frontier = self.reachable.copy()
+            while frontier.any():
+                frontier = self.edges[frontier].any(axis=0) & ~self.reachable
+                self.reachable |= frontier
+
+    @classmethod
+    def fall_tick(cls, rise, side):
+        # Номер тика спуска, на котором подъём падает ниже rise ('right')
+        # или до rise ('left')
+        return cls.FALL_START + 1 + np.searchsorted(cls.FALL_DEPTH, -rise, side)
+
+    @property
+    def platforms_reachable(self):
+        return bool(self.reachable[:self.count].all())
+
+    def landing(self, x, y):
+        # Платформа, на которую упадёт игрок с центром в (x, y), или -1
+        below = (self.left < x) & (x < self.right) & (self.bottom < y + PLAYER_SIZE / 2)
+        if not below.any():
+            return -1
+        return int(np.flatnonzero(below)[np.argmax(self.top[below])])
+
+    def reachable_points(self, x, y, reach):
+        # Дотянется ли игрок с достижимой платформы до точек (x, y) на
+        # расстояние reach: ищем последний тик дуги, на котором центр игрока
+        # ещё не ниже нужной высоты, и сравниваем зазор с пролётом за это время
+        nodes = np.flatnonzero(self.reachable)
+        x = np.asarray(x, dtype=np.float64)[:, None]
+        y = np.asarray(y, dtype=np.float64)[:, None]
+        need = y - (self.top[nodes] + PLAYER_SIZE / 2) - reach
+        tick = self.fall_tick(need, 'left') - 1
+        gap = np.maximum(np.maximum(self.left[nodes] - x, x - self.right[nodes]), 0)
+        return ((tick > self.FALL_START) & (gap < tick * PLAYER_MOVE_SPEED + reach)).any(axis=1)
+
+    def arc(self, source, target):
+        # Точки дуги прыжка (центр игрока по тикам) с платформы source на target
+        ticks = self.land_tick[source, target]
+        if not ticks:
+            return np.empty((0, 2))
+        # Разбег от края source до края target, дальше игрок стоит на месте
+        if self.left[target] >= self.right[source]:
+            start, end = self.right[source] - 0.5, self.left[target] + 0.5
+        elif self.right[target] <= self.left[source]:
+            start, end = self.left[source] + 0.5, self.right[target] - 0.5
+        else:
+            start = end = max(self.left[source], self.left[target]) + 0.5
+        steps = np.arange(1, ticks + 1)
+        x = start + np.sign(end - start) * np.minimum(steps * PLAYER_MOVE_SPEED, abs(end - start))
+        y = self.top[source] + PLAYER_SIZE / 2 + self.ARC_RISE[:ticks]
+        return np.column_stack((x, y))
+
+
+class LevelGenerator:
+    # Процедурные уровни: время, число монет, врагов и шипов, фон и ширина
+    # берутся из LEVELS, а платформы строятся заново. Каждая новая платформа
+    # ставится в пределах прыжка от уже достижимой, поэтому до всех монет
+    # (они стоят на платформах) можно добраться. Уровень зависит только от
+    # зерна и номера, так что запись забега повторяется без расхождений.
+    GROUND_Y = 120
+    GROUND_HEIGHT = 30
+    PLATFORM_HEIGHT = 20
+    # Подъём верха платформы за прыжок (вершина прыжка — 152 пикселя)
+    # и зазор между краями соседних платформ, с запасом
+    MIN_RISE = 60
+    MAX_RISE = 120
+    MAX_GAP = 150
+    # Над платформой должен помещаться игрок
+    CLEARANCE = PLAYER_SIZE + 30
+    CEILING = SCREEN_HEIGHT - 200
+    ATTEMPTS = 20
+
+    def __init__(self, seed=None):
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+
+    def generate(self, level_num):
+        params = LEVELS[level_num]
+        variant = f"{self.seed}:{level_num}"
+        rng = random.Random(variant)
+        width = params.get("width", SCREEN_WIDTH)
+        for _ in range(self.ATTEMPTS):
+            pits = level_num >= 3
+            platforms = self.layout(rng, width, pits)
+            if ReachabilityIndex(platforms, width, floor=not pits).platforms_reachable:
+                break
+        else:
+            raise RuntimeError(f"Не удалось построить уровень {variant}")
+        level = dict(params)
+        level["platforms"] = platforms
+        level["variant"] = variant
+        LevelCatalog.validate(level, f"уровень {variant}")
+        return level
+
+    def layout(self, rng, width, pits):
+        # Земля: сплошная или, начиная с третьего уровня, с провалами.
+        # Первый участок всегда под точкой появления игрока.
+        ground = []
+        x = 0
+        while x < width:
+            segment = width - x
+            if pits:
+                segment = rng.randint(250, 400)
+                if width - x - segment < 250:
+                    segment = width - x
+            ground.append([x, self.GROUND_Y, segment, self.GROUND_HEIGHT])
+            x += segment + rng.randint(80, self.MAX_GAP)
+
+        platforms = list(ground)
+        count = len(ground) + max(4, width // 150)
+        min_width, max_width = (100, 200) if pits else (120, 260)
+        for _ in range(count * self.ATTEMPTS):
+            if len(platforms) >= count:
+                break
+            parent_x, parent_y, parent_w, parent_h = rng.choice(platforms)
+            plat_w = rng.randint(min_width, max_width)
+            top = parent_y + parent_h + rng.randint(self.MIN_RISE, self.MAX_RISE)
+            if top > self.CEILING:
+                continue
+            plat_x = rng.randint(max(0, parent_x - plat_w - self.MAX_GAP),
+                                 max(0, min(width - plat_w, parent_x + parent_w + self.MAX_GAP)))
+            plat = [plat_x, top - self.PLATFORM_HEIGHT, plat_w, self.PLATFORM_HEIGHT]
+            if all(self.clear(plat, other) for other in platforms):
+                platforms.append(plat)
+        return platforms
+
+    @classmethod
+    def clear(cls, plat, other):
+        overlap = plat[0] < other[0] + other[2] + 20 and other[0] < plat[0] + plat[2] + 20
+        return not overlap or abs(plat[1] + plat[3] - other[1] - other[3]) >= cls.CLEARANCE
+
+
+class LevelPrefetcher:
+    # Собирает уровни LevelGenerator в фоновом потоке, пока идёт текущий:
+    # к нажатию ПРОБЕЛА на экране «Уровень пройден» следующий уже готов
+    def __init__(self, generator):
+        self.generator = generator
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-generator")
+        self.pending = {}
+
+    def prefetch(self, level_num):
+        if level_num in LEVELS and level_num not in self.pending:
+            self.pending[level_num] = self.executor.submit(self.generator.generate, level_num)
+
+    def take(self, level_num):
+        self.prefetch(level_num)
+        # Если уровень ещё не готов, ждём его: от этого он не изменится
+        level = self.pending[level_num].result()
+        # После последнего уровня игра начинается заново с первого
+        self.prefetch(level_num + 1 if level_num + 1 in LEVELS else 1)
+        return level
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SpatialHash:
+    # Равномерная сетка для широкой фазы столкновений. Объекты хранятся по
+    # ключам вида (вид, индекс) во всех ячейках, которые задевает их AABB.
+    def __init__(self, cell_size: float = 128):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.cell_ranges = {}
+
+    def _cell_range(self, left, bottom, right, top):
+        size = self.cell_size
+        return (int(left // size), int(bottom // size),
+                int(right // size), int(top // size))
+
+    def clear(self):
+        self.cells.clear()
+        self.cell_ranges.clear()
+
+    def insert(self, key, left, bottom, right, top):
+        cell_range = self._cell_range(left, bottom, right, top)
+        self.cell_ranges[key] = cell_range
+        x0, y0, x1, y1 = cell_range
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    bucket = cells[(cx, cy)] = set()
+                bucket.add(key)
+
+    def remove(self, key):
+        cell_range = self.cell_ranges.pop(key, None)
+        if cell_range is None:
+            return
+        x0, y0, x1, y1 = cell_range
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del cells[(cx, cy)]
+
+    def query(self, left, bottom, right, top):
+        x0, y0, x1, y1 = self._cell_range(left, bottom, right, top)
+        cells = self.cells
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def query_kind(self, kind, left, bottom, right, top):
+        # Индексы объектов одного вида в исходном порядке списка
+        return sorted(index for key_kind, index in self.query(left, bottom, right, top)
+                      if key_kind == kind)
+
+
+@dataclass
+class StepInput:
+    # Ввод за один шаг симуляции: move — новое направление (-1, 0, 1)
+    # или None, если не менялось; jump — нажатие ПРОБЕЛА; restart — R
+    move: Optional[int] = None
+    jump: bool = False
+    restart: bool = False
+
+
+class EntityStore:
+    # Однотипные объекты уровня столбцами NumPy: объект i — это строка i
+    # во всех столбцах. Столбцы перечислены в FIELDS.
+    FIELDS = {"x": np.float64, "y": np.float64}
+    # До стольких объектов обход строк циклом дешевле десятка вызовов NumPy:
+    # на таких уровнях накладные расходы на вызов дороже самой работы
+    SMALL_COUNT = 32
+    NO_HITS = np.zeros(0, dtype=np.intp)
+
+    def __init__(self, count=0):
+        self.count = count
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(count, dtype=dtype))
+
+    @classmethod
+    def from_records(cls, records):
+        store = cls(len(records))
+        for name in cls.FIELDS:
+            column = getattr(store, name)
+            for i, record in enumerate(records):
+                column[i] = record[name]
+        return store
+
+    def __len__(self):
+        return self.count
+
+    def hit_y(self, index):
+        return self.y[index]
+
+    def hit_y_row(self, i):
+        return self.y.item(i)
+
+    def hits(self, x, y, reach, candidates=None):
+        # Одна пакетная проверка расстояний: индексы объектов ближе reach
+        # в порядке возрастания
+        if self.count <= self.SMALL_COUNT:
+            return self.hits_rows(x, y, reach, candidates)
+        if candidates is None:
+            index = np.arange(self.count)
+        else:
+            index = np.asarray(candidates, dtype=np.intp)
+        dx = self.x[index] - x
+        dy = self.hit_y(index) - y
+        return index[dx * dx + dy * dy < reach * reach]
+
+    def hits_rows(self, x, y, reach, candidates):
+        rows = range(self.count) if candidates is None else candidates
+        hits = []
+        for i in rows:
+            dx = self.x.item(i) - x
+            dy = self.hit_y_row(i) - y
+            if dx * dx + dy * dy < reach * reach:
+                hits.append(i)
+        return np.array(hits, dtype=np.intp) if hits else self.NO_HITS
+
+
+class CoinStore(EntityStore):
+    FIELDS = {"x": np.float64, "y": np.float64, "rotation": np.float64,
+              "bounce": np.float64, "collected": np.bool_}
+
+    def animate(self, delta_time, active):
+        self.rotation[active] += delta_time * 2
+        self.bounce[active] += delta_time * 1.5
+
+    def hit_y(self, index):
+        # Монета подпрыгивает на ±3 пикселя
+        return self.y[index] + np.sin(self.bounce[index]) * 3
+
+    def hit_y_row(self, i):
+        return self.y.item(i) + math.sin(self.bounce.item(i)) * 3
+
+    def hits(self, x, y, reach, candidates=None):
+        hits = super().hits(x, y, reach, candidates)
+        if not len(hits):
+            return hits
+        return hits[~self.collected[hits]]
+
+
+class EnemyStore(EntityStore):
+    # Враг ходит по своей платформе между left и right (посчитаны при
+    # загрузке уровня); ground — высота, на которой он стоит.
+    # Поведение: PATROL — ходит туда-обратно, CHASE — вдобавок бежит к
+    # игроку, если тот рядом и на его высоте, JUMP — ещё и подпрыгивает
+    # раз в JUMP_INTERVAL тиков. Все враги обновляются одним проходом
+    # по столбцам.
+    FIELDS = {"x": np.float64, "prev_x": np.float64, "y": np.float64, "prev_y": np.float64,
+              "dx": np.float64, "dy": np.float64, "left": np.float64, "right": np.float64,
+              "ground": np.float64, "behavior": np.int8, "cooldown": np.float64}
+    PATROL, CHASE, JUMP = range(3)
+    PATROL_SPEED = 1.5
+    CHASE_SPEED = 2.5
+    CHASE_RANGE = 250
+    CHASE_HEIGHT = PLAYER_SIZE
+    JUMP_SPEED = 10
+    JUMP_INTERVAL = 90
+
+    def __init__(self, count=0):
+        super().__init__(count)
+        self.index_behaviors()
+
+    @classmethod
+    def from_records(cls, records):
+        store = super().from_records(records)
+        store.index_behaviors()
+        return store
+
+    @classmethod
+    def behaviors(cls, level):
+        # С каждым уровнем добавляется по поведению
+        return (cls.PATROL, cls.CHASE, cls.JUMP)[:max(1, min(level, 3))]
+
+    def index_behaviors(self):
+        # Поведение врага до конца уровня не меняется: маски преследователей
+        # и прыгунов считаются один раз
+        self.chasers = self.behavior == self.CHASE
+        self.jumpers = self.behavior == self.JUMP
+        self.any_chasers = bool(self.chasers.any())
+        self.any_jumpers = bool(self.jumpers.any())
+        # Неизменные столбцы списками — для обхода по строкам
+        self.rows = list(zip(range(self.count), self.behavior.tolist(), self.left.tolist(),
+                             self.right.tolist(), self.ground.tolist()))
+
+    def move(self, ticks, active, player_x, player_y):
+        # Враги вдали от камеры стоят на месте, пока она не подъедет
+        if self.count <= self.SMALL_COUNT:
+            self.move_rows(ticks, active, player_x, player_y)
+            return
+        # Столбцы меняются на месте; блоки поведений, которых на уровне нет
+        # или которые сейчас вне кадра, пропускаются целиком
+        x, dx = self.x, self.dx
+        if self.any_chasers:
+            chasing = active & self.chasers
+            if chasing.any():
+                offset = player_x - x
+                near = (chasing & (np.abs(offset) < self.CHASE_RANGE) &
+                        (np.abs(player_y - self.ground) < self.CHASE_HEIGHT))
+                np.copysign(self.PATROL_SPEED, dx, out=dx, where=chasing)
+                np.copysign(self.CHASE_SPEED, offset, out=dx, where=near)
+        np.add(x, dx * ticks, out=x, where=active)
+        # У края платформы патрульный разворачивается, преследователь ждёт
+        np.copyto(dx, self.PATROL_SPEED, where=x < self.left)
+        np.copyto(dx, -self.PATROL_SPEED, where=x > self.right)
+        np.minimum(np.maximum(x, self.left, out=x), self.right, out=x)
+
+        # В воздухе бывают только прыгуны, остальных это не касается
+        if not self.any_jumpers:
+            return
+        jumping = active & self.jumpers
+        if not jumping.any():
+            return
+        y, dy, ground, cooldown = self.y, self.dy, self.ground, self.cooldown
+        np.subtract(cooldown, ticks, out=cooldown, where=jumping)
+        launch = jumping & (cooldown <= 0) & (y <= ground)
+        if launch.any():
+            dy[launch] = self.JUMP_SPEED
+            cooldown[launch] = self.JUMP_INTERVAL
+        airborne = jumping & ((y > ground) | (dy > 0))
+        if airborne.any():
+            np.subtract(dy, GRAVITY * ticks, out=dy, where=airborne)
+            np.add(y, dy * ticks, out=y, where=airborne)
+            landed = airborne & (y <= ground)
+            np.copyto(y, ground, where=landed)
+            np.copyto(dy, 0.0, where=landed)
+
+    def move_rows(self, ticks, active, player_x, player_y):
+        # То же, что move(), по строкам и с теми же операциями над float
+        x = self.x.tolist()
+        dx = self.dx.tolist()
+        y = self.y.tolist()
+        dy = self.dy.tolist()
+        cooldown = self.cooldown.tolist()
+        active = active.tolist()
+        chase, jump = self.CHASE, self.JUMP
+        patrol_speed, chase_speed = self.PATROL_SPEED, self.CHASE_SPEED
+        chase_range, chase_height = self.CHASE_RANGE, self.CHASE_HEIGHT
+        for i, behavior, left, right, ground in self.rows:
+            if not active[i]:
+                continue
+            if behavior == chase:
+                offset = player_x - x[i]
+                if abs(offset) < chase_range and abs(player_y - ground) < chase_height:
+                    dx[i] = math.copysign(chase_speed, offset)
+                else:
+                    dx[i] = math.copysign(patrol_speed, dx[i])
+            position = x[i] + dx[i] * ticks
+            if position < left:
+                dx[i] = patrol_speed
+                position = left
+            elif position > right:
+                dx[i] = -patrol_speed
+                position = right
+            x[i] = position
+            if behavior != jump:
+                continue
+            cooldown[i] -= ticks
+            if cooldown[i] <= 0 and y[i] <= ground:
+                dy[i] = self.JUMP_SPEED
+                cooldown[i] = self.JUMP_INTERVAL
+            if y[i] > ground or dy[i] > 0:
+                dy[i] -= GRAVITY * ticks
+                y[i] += dy[i] * ticks
+                if y[i] <= ground:
+                    y[i] = ground
+                    dy[i] = 0.0
+        self.x[:] = x
+        self.dx[:] = dx
+        if self.any_jumpers:
+            self.y[:] = y
+            self.dy[:] = dy
+            self.cooldown[:] = cooldown
+
+
+class HazardStore(EntityStore):
+    FIELDS = {"x": np.float64, "y": np.float64, "rotation": np.float64, "pulse": np.float64}
+
+    def animate(self, delta_time, active):
+        self.rotation[active] += delta_time * 2
+        self.pulse[active] += delta_time * 3
+
+
+class GameState:
+    # Правила игры без окна и OpenGL: GameView только подаёт ввод в step()
+    # и превращает события из self.events в частицы и записи сохранения.
+    # Шип не ставится ближе этого к монетам и к месту появления игрока
+    HAZARD_CLEARANCE = HAZARD_HEIGHT + PLAYER_SIZE
+    HAZARD_ATTEMPTS = 50
+
+    def __init__(self, level=1, seed=None, generator=None):
+        self.rng = random.Random(seed)
+        # LevelPrefetcher для процедурных уровней или None
+        self.generator = generator
+        self.player_x = SCREEN_WIDTH // 4
+        self.player_y = SCREEN_HEIGHT // 2
+        self.prev_player_x = self.player_x
+        self.prev_player_y = self.player_y
+        self.player_dx = 0
+        self.player_dy = 0
+        self.jumping = False
+        self.was_jumping = False
+        self.coins = CoinStore()
+        self.enemies = EnemyStore()
+        self.hazards = HazardStore()
+        self.platforms = []
+        self.score = 0
+        self.coins_collected = 0
+        self.total_coins = 0
+        self.level = level
+        self.level_data = {}
+        self.world_width = SCREEN_WIDTH
+        self.camera_x = 0
+        self.time_left = 0
+        self.game_over = False
+        self.level_complete = False
+        self.run_finished = False
+        self.lives = 3
+        self.last_enemy_collision_time = 0
+        self.collision_cooldown = 0.5
+        self.life_restored_this_level = False
+        self.events = []
+        self.spatial_hash = SpatialHash()
+        self.load_level(level)
+
+    def load_level(self, level_num):
+        if level_num not in LEVELS:
+            self.level_complete = True
+            self.game_over = True
+            self.run_finished = True
+            return
+        if self.generator is not None:
+            self.load_level_data(level_num, self.generator.take(level_num))
+        else:
+            self.load_level_data(level_num, LEVELS[level_num])
+
+    def load_level_data(self, level_num, level_data):
+        # Уровень в формате LEVELS — в том числе не из самого словаря
+        rng = self.rng
+
+        self.level = level_num
+        self.level_data = level_data
+        self._reachability = None
+        self.world_width = world_width = level_data.get("width", SCREEN_WIDTH)
+        self.player_x, self.player_y = PLAYER_SPAWN
+        self.prev_player_x = self.player_x
+        self.prev_player_y = self.player_y
+        self.player_dx = 0
+        self.player_dy = 0
+        self.jumping = False
+        self.was_jumping = False
+        self.coins_collected = 0
+        self.platforms = []
+        for plat in level_data["platforms"]:
+            self.platforms.append(plat)
+        coins = []
+        self.total_coins = level_data["coins"]
+
+        for i in range(self.total_coins):
+            if self.platforms:
+                plat_index = i % len(self.platforms)
+                plat = self.platforms[plat_index]
+                segments = min(2, self.total_coins // len(self.platforms) + 1)
+                segment = (i // len(self.platforms)) % segments
+                x = plat[0] + plat[2] * (segment + 1) / (segments + 1)
+                y = plat[1] + plat[3] + 35
+            else:
+                x = rng.randint(100, world_width - 100)
+                y = rng.randint(200, SCREEN_HEIGHT - 100)
+
+            coins.append({
+                "x": x,
+                "y": y,
+                "collected": False,
+                "rotation": rng.random() * 6.28,
+                "bounce": rng.random() * 6.28})
+
+        enemies = []
+        behaviors = EnemyStore.behaviors(level_num)
+        enemy_radius = ENEMY_SIZE / 2
+        for i in range(level_data["enemies"]):
+            if self.platforms[1:]:
+                plat = rng.choice(self.platforms[1:])
+                x = plat[0] + plat[2] * 0.5
+                y = plat[1] + plat[3] + enemy_radius + 5
+                # Враг не сходит со своей платформы; на узкой стоит посередине
+                left = min(plat[0] + enemy_radius, x)
+                right = max(plat[0] + plat[2] - enemy_radius, x)
+            else:
+                x = rng.randint(100, world_width - 100)
+                y = 200
+                left, right = enemy_radius, world_width - enemy_radius
+
+            enemies.append({
+                "x": x,
+                "prev_x": x,
+                "y": y,
+                "prev_y": y,
+                "dx": rng.choice([-EnemyStore.PATROL_SPEED, EnemyStore.PATROL_SPEED]),
+                "dy": 0,
+                "left": left,
+                "right": right,
+                "ground": y,
+                "behavior": rng.choice(behaviors),
+                "cooldown": rng.random() * EnemyStore.JUMP_INTERVAL})
+        hazards = []
+        coin_x = np.array([coin["x"] for coin in coins], dtype=np.float64)
+        coin_y = np.array([coin["y"] for coin in coins], dtype=np.float64)
+        for i in range(level_data["hazards"]):
+            # Место, которое задевает монету или точку появления, тянем заново
+            for _ in range(self.HAZARD_ATTEMPTS):
+                if rng.random() > 0.4:
+                    x = rng.randint(100, world_width - 100)
+                    y = 140
+                else:
+                    if len(self.platforms) > 2:
+                        plat1, plat2 = rng.sample(self.platforms[1:], 2)
+                        x = (plat1[0] + plat2[0] + plat2[2] / 2) / 2
+                        y = (plat1[1] + plat2[1]) / 2
+                    else:
+                        x = rng.randint(100, world_width - 100)
+                        y = rng.randint(200, 400)
+                if self.hazard_allowed(x, y, coin_x, coin_y):
+                    break
+
+            hazards.append({
+                "x": x,
+                "y": y,
+                "rotation": 0,
+                "pulse": rng.random() * 6.28})
+        self.follow_player()
+        self.coins = CoinStore.from_records(coins)
+        self.enemies = EnemyStore.from_records(enemies)
+        self.hazards = HazardStore.from_records(hazards)
+        self.time_left = level_data["time"]
+        self.build_spatial_hash()
+
+        self.game_over = False
+        self.level_complete = False
+        self.run_finished = False
+        self.last_enemy_collision_time = 0
+        self.life_restored_this_level = False
+        self.events.append(("level_loaded", self.player_x, self.player_y))
+
+        if level_num > 1 and self.lives < 3:
+            if not self.life_restored_this_level:
+                self.lives += 1
+                self.life_restored_this_level = True
+                self.score += 25
+                self.events.append(("life_restored", self.player_x, self.player_y))
+
+    @staticmethod
+    def camera_left(player_x, world_width):
+        return min(max(player_x - SCREEN_WIDTH / 2, 0), max(world_width - SCREEN_WIDTH, 0))
+
+    def follow_player(self):
+        self.camera_x = self.camera_left(self.player_x, self.world_width)
+
+    def active_range(self):
+        return self.camera_x - CULL_MARGIN, self.camera_x + SCREEN_WIDTH + CULL_MARGIN
+
+    def active(self, x):
+        left, right = self.active_range()
+        return (x > left) & (x < right)
+
+    def build_spatial_hash(self):
+        spatial_hash = self.spatial_hash
+        spatial_hash.clear()
+        for i, (x, y, width, height) in enumerate(self.platforms):
+            spatial_hash.insert(("platform", i), x, y, x + width, y + height)
+        # Враги в сетку не попадают: они двигаются каждый тик и
+        # проверяются одной пакетной проверкой по EnemyStore
+        coins = self.coins
+        for i in np.flatnonzero(~coins.collected).tolist():
+            # Монета подпрыгивает на ±3 пикселя
+            x, y = coins.x[i], coins.y[i]
+            spatial_hash.insert(("coin", i),
+                                x - COIN_SIZE, y - COIN_SIZE - 3,
+                                x + COIN_SIZE, y + COIN_SIZE + 3)
+        hazards = self.hazards
+        for i, (x, y) in enumerate(zip(hazards.x.tolist(), hazards.y.tolist())):
+            spatial_hash.insert(("hazard", i),
+                                x - HAZARD_HEIGHT, y - HAZARD_HEIGHT,
+                                x + HAZARD_HEIGHT, y + HAZARD_HEIGHT)
+
+    @classmethod
+    def hazard_allowed(cls, x, y, coin_x, coin_y):
+        # Под точкой появления игрок падает по вертикали — весь столб под ней
+        # тоже должен быть свободен
+        spawn_x, spawn_y = PLAYER_SPAWN
+        if abs(x - spawn_x) < cls.HAZARD_CLEARANCE and y < spawn_y + cls.HAZARD_CLEARANCE:
+            return False
+        return not np.any(np.hypot(coin_x - x, coin_y - y) < cls.HAZARD_CLEARANCE)
+
+    @property
+    def reachability(self):
+        # Граф прыжков строится один раз на уровень, по первому запросу
+        if self._reachability is None:
+            self._reachability = ReachabilityIndex(self.platforms, self.world_width,
+                                                   floor=self.level < 3)
+        return self._reachability
+
+    def problems(self):
+        # Что мешает пройти уровень: список пуст, если всё в порядке
+        problems = []
+        index = self.reachability
+        if index.start < 0:
+            problems.append("игрок появляется над пропастью")
+        reach = COIN_SIZE + PLAYER_SIZE / 2
+        unreachable = np.flatnonzero(~index.reachable_points(self.coins.x, self.coins.y, reach))
+        if len(unreachable):
+            problems.append(f"недостижимые монеты: {unreachable.tolist()}")
+        coins = self.coins
+        for i, (x, y) in enumerate(zip(self.hazards.x.tolist(), self.hazards.y.tolist())):
+            if not self.hazard_allowed(x, y, coins.x, coins.y):
+                problems.append(f"шип {i} у монеты или точки появления")
+        return problems
+
+    def new_game(self):
+        self.score = 0
+        self.lives = 3
+        self.load_level(1)
+
+    def drain_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def checksum(self):
+        # Отпечаток игрового состояния для сверки записи и повтора
+        values = [self.level, self.player_x, self.player_y, self.player_dx, self.player_dy,
+                  self.time_left, self.score, self.coins_collected, self.lives,
+                  self.game_over, self.level_complete]
+        return zlib.crc32(np.concatenate((np.array(values, dtype=np.float64),
+                                          self.enemies.x, self.enemies.y)).tobytes())
+
+
+def step(state, inputs, delta_time):
+    if inputs.move == 0:
+        state.player_dx = 0
+
+    if state.game_over:
+        if inputs.jump:
+            state.new_game()
+    elif state.level_complete:
+        if inputs.jump:
+            if state.level < len(LEVELS):
+                state.load_level(state.level + 1)
+            else:
+                state.new_game()
+    else:
+        if inputs.jump and not state.jumping:
+            state.player_dy = PLAYER_JUMP_SPEED
+            state.jumping = True
+            state.was_jumping = True
+            state.events.append(("jump", state.player_x, state.player_y))
+        if inputs.move:
+            state.player_dx = inputs.move * PLAYER_MOVE_SPEED
+        if inputs.restart:
+            state.load_level(state.level)
+
+    _advance(state, delta_time)
+    if (state.game_over or state.level_complete) and not state.run_finished:
+        # Итог забега публикуется ровно один раз
+        state.run_finished = True
+        state.events.append(("run_finished", state.player_x, state.player_y))
+
+
+def _advance(state, delta_time):
+    # Скорости заданы в пикселях за тик SIMULATION_DT
+    ticks = delta_time * SIMULATION_RATE
+    state.prev_player_x = state.player_x
+    state.prev_player_y = state.player_y
+    state.enemies.prev_x[:] = state.enemies.x
+    state.enemies.prev_y[:] = state.enemies.y
+    state.last_enemy_collision_time += delta_time
+
+    if state.game_over or state.level_complete:
+        state.coins.animate(delta_time, state.active(state.coins.x))
+        state.hazards.animate(delta_time, state.active(state.hazards.x))
+        return
+
+    state.time_left -= delta_time
+    if state.time_left <= 0:
+        state.game_over = True
+        return
+
+    PROFILER.begin("physics")
+    _move_player(state, ticks)
+    PROFILER.end("physics")
+
+    PROFILER.begin("collision")
+    _collide_player(state)
+    PROFILER.end("collision")
+    if state.level_complete:
+        return
+    # Падение в пропасть проверяется после приземления: за длинный шаг
+    # игрок может пролететь ниже края, хотя по пути встал на платформу
+    if state.level >= 3 and state.player_y < -100:
+        state.lives = 0
+        state.game_over = True
+        return
+
+    PROFILER.begin("physics")
+    _move_enemies(state, ticks)
+    PROFILER.end("physics")
+
+    PROFILER.begin("collision")
+    _collide_enemies_and_hazards(state)
+    PROFILER.end("collision")
+
+
+def _move_player(state, ticks):
+    state.player_dy -= GRAVITY * ticks
+    old_player_y = state.player_y
+    state.player_x += state.player_dx * ticks
+    state.player_y += state.player_dy * ticks
+
+    if old_player_y > state.player_y and not state.jumping:
+        state.was_jumping = True
+
+    if state.player_x < PLAYER_SIZE / 2:
+        state.player_x = PLAYER_SIZE / 2
+    if state.player_x > state.world_width - PLAYER_SIZE / 2:
+        state.player_x = state.world_width - PLAYER_SIZE / 2
+    if state.level < 3:
+        if state.player_y < PLAYER_SIZE / 2:
+            state.player_y = PLAYER_SIZE / 2
+            state.player_dy = 0
+            state.jumping = False
+
+    if state.player_y > SCREEN_HEIGHT - PLAYER_SIZE / 2:
+        state.player_y = SCREEN_HEIGHT - PLAYER_SIZE / 2
+        state.player_dy = 0
+    state.follow_player()
+
+
+def swept_aabb(x, y, dx, dy, half_size, box):
+    # Квадрат со стороной 2 * half_size летит из (x, y) на (dx, dy).
+    # Он сжимается в точку, box = (x, y, ширина, высота) расширяется на
+    # half_size, и луч пересекает полосы по x и по y. Возвращает время
+    # первого касания t в [0, 1] и ось грани, через которую квадрат вошёл
+    # (0 — боковая, 1 — верх или низ), или None, если касания на отрезке
+    # нет или квадрат уже внутри.
+    left, bottom, width, height = box
+    entry = [-math.inf, -math.inf]
+    leave = [math.inf, math.inf]
+    slabs = ((x, dx, left - half_size, left + width + half_size),
+             (y, dy, bottom - half_size, bottom + height + half_size))
+    for axis, (start, delta, low, high) in enumerate(slabs):
+        if delta == 0:
+            if not low < start < high:
+                return None
+            continue
+        t_low = (low - start) / delta
+        t_high = (high - start) / delta
+        entry[axis] = min(t_low, t_high)
+        leave[axis] = max(t_low, t_high)
+    t_entry = max(entry)
+    if t_entry >= min(leave) or not 0 <= t_entry <= 1:
+        return None
+    return t_entry, 0 if entry[0] > entry[1] else 1
+
+
+def _landing_platform(state, player_radius):
+    spatial_hash = state.spatial_hash
+    if state.player_dy > 0:
+        return None
+    # Платформы проходимы снизу и сбоку, поэтому приземление — это самое
+    # раннее касание верхней грани на всём пути за шаг: иначе при большой
+    # скорости или длинном шаге игрок проскакивает тонкие платформы.
+    # Над платформой игрок должен быть в момент касания; касание в самом
+    # начале шага — это стояние на ней, и тогда к концу шага он должен
+    # остаться над платформой, иначе сошёл с края и падает дальше.
+    player_left = state.player_x - player_radius
+    player_right = state.player_x + player_radius
+    x0, y0 = state.prev_player_x, state.prev_player_y
+    dx = state.player_x - x0
+    dy = state.player_y - y0
+    landing = None
+    if dy < 0:
+        earliest = math.inf
+        for index in spatial_hash.query_kind("platform",
+                                             min(x0, state.player_x) - player_radius,
+                                             state.player_y - player_radius,
+                                             max(x0, state.player_x) + player_radius,
+                                             y0 + player_radius):
+            plat_x, plat_y, plat_w, plat_h = state.platforms[index]
+            hit = swept_aabb(x0, y0, dx, dy, player_radius, state.platforms[index])
+            if hit is None or hit[1] != 1 or hit[0] >= earliest:
+                continue
+            hit_x = state.player_x if hit[0] == 0 else x0 + dx * hit[0]
+            if hit_x + player_radius > plat_x and hit_x - player_radius < plat_x + plat_w:
+                earliest, landing = hit[0], index
+    if landing is not None:
+        return landing
+
+    # Касания сверху не было, но игрок оказался в платформе (зашёл сбоку
+    # при падении) — как и раньше, ставим его на неё
+    player_top = state.player_y + player_radius
+    player_bottom = state.player_y - player_radius
+    for index in spatial_hash.query_kind("platform", player_left, player_bottom,
+                                         player_right, player_top):
+        plat_x, plat_y, plat_w, plat_h = state.platforms[index]
+        if (player_right > plat_x and
+                player_left < plat_x + plat_w and
+                player_bottom < plat_y + plat_h and
+                player_top > plat_y):
+            return index
+    return None
+
+
+def _collide_player(state):
+    # Приземление на платформы и сбор монет
+    was_in_air = state.jumping
+    state.jumping = True
+    spatial_hash = state.spatial_hash
+    player_radius = PLAYER_SIZE / 2
+    player_left = state.player_x - player_radius
+    player_right = state.player_x + player_radius
+    landing = _landing_platform(state, player_radius)
+    if landing is not None:
+        plat_x, plat_y, plat_w, plat_h = state.platforms[landing]
+        state.player_y = plat_y + plat_h + player_radius
+        state.player_dy = 0
+        state.jumping = False
+        if was_in_air and state.was_jumping:
+            state.events.append(("landing", state.player_x, state.player_y))
+            state.was_jumping = False
+
+    # После приземления игрок мог сдвинуться вверх — пересчитываем его рамку
+    player_bottom = state.player_y - player_radius
+    player_top = state.player_y + player_radius
+    coins = state.coins
+    candidates = spatial_hash.query_kind("coin", player_left, player_bottom,
+                                         player_right, player_top)
+    for index in coins.hits(state.player_x, state.player_y,
+                            COIN_SIZE + player_radius, candidates).tolist():
+        coins.collected[index] = True
+        spatial_hash.remove(("coin", index))
+        state.coins_collected += 1
+        state.score += 100
+        state.events.append(("coin", coins.x[index].item(), coins.y[index].item()))
+
+    if state.coins_collected >= len(state.coins):
+        state.level_complete = True
+        bonus = int(state.time_left) * 10
+        state.score += bonus
+
+
+def _move_enemies(state, ticks):
+    state.enemies.move(ticks, state.active(state.enemies.x), state.player_x, state.player_y)
+
+
+def _collide_enemies_and_hazards(state):
+    spatial_hash = state.spatial_hash
+    player_radius = PLAYER_SIZE / 2
+    player_left = state.player_x - player_radius
+    player_right = state.player_x + player_radius
+    player_top = state.player_y + player_radius
+    player_bottom = state.player_y - player_radius
+
+    # После удара действует перезарядка, поэтому важен только первый враг
+    hits = state.enemies.hits(state.player_x, state.player_y, ENEMY_SIZE / 2 + player_radius)
+    if len(hits) and state.last_enemy_collision_time > state.collision_cooldown:
+        dx = state.enemies.x[hits[0]] - state.player_x
+        state.lives -= 1
+        state.last_enemy_collision_time = 0
+        state.events.append(("enemy_hit", state.player_x, state.player_y))
+        knockback = 3
+        state.player_dx = -knockback if dx > 0 else knockback
+        state.player_dy = knockback * 0.3
+
+        if state.lives <= 0:
+            state.game_over = True
+
+    hazards = state.hazards
+    candidates = spatial_hash.query_kind("hazard", player_left, player_bottom,
+                                         player_right, player_top)
+    for index in hazards.hits(state.player_x, state.player_y,
+                              HAZARD_HEIGHT + player_radius, candidates).tolist():
+        dx = hazards.x[index] - state.player_x
+        state.lives -= 1
+        state.events.append(("hazard_hit", state.player_x, state.player_y))
+        knockback = 8
+        state.player_dx = -knockback if dx > 0 else knockback
+        state.player_dy = knockback * 0.4
+        if state.lives <= 0:
+            state.game_over = True
+
+
+class InputRecording:
+    # Забег = уровень, зерно и ввод по тикам. Пишутся только тики с вводом:
+    # [тик, move, флаги], где флаги — jump | restart << 1. Каждые
+    # CHECKSUM_INTERVAL тиков сохраняется контрольная сумма состояния.
+    VERSION = 4
+    CHECKSUM_INTERVAL = 60
+
+    def __init__(self, level=1, seed=None, procedural=False):
+        self.level = level
+        self.seed = seed
+        self.procedural = procedural
+        self.ticks = 0
+        self.inputs = {}
+        self.checksums = {}
+
+    def record(self, tick, inputs):
+        if inputs != StepInput():
+            self.inputs[tick] = inputs
+
+    def after_step(self, tick, state):
+        self.ticks = tick + 1
+        if self.ticks % self.CHECKSUM_INTERVAL == 0:
+            self.checksums[self.ticks] = state.checksum()
+
+    def save(self, path):
+        data = {
+            "version": self.VERSION,
+            "level": self.level,
+            "seed": self.seed,
+            "procedural": self.procedural,
+            "rate": SIMULATION_RATE,
+            "ticks": self.ticks,
+            "inputs": [[tick, inputs.move, int(inputs.jump) | int(inputs.restart) << 1]
+                       for tick, inputs in sorted(self.inputs.items())],
+            "checksums": sorted(self.checksums.items())}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != cls.VERSION or data.get("rate") != SIMULATION_RATE:
+            raise ValueError(f"Несовместимая запись {path}")
+        recording = cls(data["level"], data["seed"], data.get("procedural", False))
+        recording.ticks = data["ticks"]
+        for tick, move, flags in data["inputs"]:
+            recording.inputs[tick] = StepInput(move, bool(flags & 1), bool(flags & 2))
+        recording.checksums = {tick: checksum for tick, checksum in data["checksums"]}
+        return recording
+
+
+class InputRecorder:
+    # Подключается к GameView: пропускает ввод с клавиатуры и пишет его
+    def __init__(self, recording):
+        self.recording = recording
+
+    def input_for(self, tick, pending):
+        self.recording.record(tick, pending)
+        return pending
+
+    def after_step(self, tick, state):
+        self.recording.after_step(tick, state)
+
+
+class InputReplay:
+    # Подключается к GameView вместо клавиатуры и сверяет контрольные суммы
+    def __init__(self, recording):
+        self.recording = recording
+        self.mismatches = []
+        self.ticks = 0
+
+    @property
+    def finished(self):
+        return self.ticks >= self.recording.ticks
+
+    def input_for(self, tick, pending):
+        return self.recording.inputs.get(tick, StepInput())
+
+    def after_step(self, tick, state):
+        self.ticks = tick + 1
+        expected = self.recording.checksums.get(self.ticks)
+        if expected is not None and expected != state.checksum():
+            self.mismatches.append(self.ticks)
+
+
+def run_replay(window, path, fast=False, trace_path=None):
+    # Повтор записи по одному тику на кадр: в реальном темпе (60 Гц)
+    # или без пауз. Время кадра — это обновление плюс отрисовка.
+    recording = InputRecording.load(path)
+    replay = InputReplay(recording)
+    view = GameView(recording.level, recording.seed, session=replay,
+                    procedural=recording.procedural)
+    window.show_view(view)
+    frame_times = []
+    next_frame = time.perf_counter()
+    while not replay.finished and window.current_view is view:
+        window.dispatch_events()
+        frame_start = time.perf_counter()
+        view.on_update(SIMULATION_DT)
+        view.on_draw()
+        window.ctx.finish()
+        frame_times.append((time.perf_counter() - frame_start) * 1000)
+        window.flip()
+        if not fast:
+            next_frame += SIMULATION_DT
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    if trace_path:
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            json.dump({"recording": path, "fast": fast, "frame_ms": frame_times}, f)
+    if frame_times:
+        p50, p95, p99 = FrameProfiler.percentiles(frame_times)
+        print(f"Кадров: {len(frame_times)}, p50 {p50:.2f} мс, p95 {p95:.2f} мс, p99 {p99:.2f} мс")
+    if not replay.finished:
+        print(f"Повтор прерван на тике {replay.ticks} из {recording.ticks}")
+    if replay.mismatches:
+        print(f"Расхождение состояния, первый тик: {replay.mismatches[0]}")
+        return False
+    print("Контрольные суммы совпали")
+    return True
+
+
+def check_levels(seeds):
+    # Прогон расстановки всех уровней, обычных и случайных, на зёрнах
+    # 0..seeds-1 через GameState.problems(); окно для этого не нужно
+    started = time.perf_counter()
+    checked = failed = 0
+    for procedural in (False, True):
+        for seed in range(seeds):
+            generator = LevelGenerator(seed) if procedural else None
+            state = GameState(seed=seed)
+            for level_num in LEVELS:
+                level_data = generator.generate(level_num) if procedural else LEVELS[level_num]
+                state.load_level_data(level_num, level_data)
+                problems = state.problems()
+                checked += 1
+                if problems:
+                    failed += 1
+                    kind = "случайный" if procedural else "обычный"
+                    print(f"Уровень {level_num} ({kind}), зерно {seed}: {'; '.join(problems)}")
+    elapsed = time.perf_counter() - started
+    print(f"Проверено уровней: {checked}, с ошибками: {failed}, {checked / elapsed:.0f} в секунду")
+    return failed == 0
 
 
 class StartView(arcade.View):
+    # Картинка меню с прошлого запуска; поднять после изменения рисунка меню
+    MENU_CACHE_FILE = os.path.join(WARM_CACHE_DIR, "menu.npz")
+    MENU_CACHE_VERSION = 1
+    # Картинка меню берётся с диска и пишется туда только при первом показе
+    # меню за процесс
+    _startup = True
+    # Буферы фона и меню размером с окно — одни на все экраны меню
+    _layers = None
+    # Столбцы таблицы рекордов: ключ, заголовок, x, выравнивание
+    LEADERBOARD_COLUMNS = [
+        ("level", "Ур.", 540, "left"),
+        ("runs", "Забегов", 715, "right"),
+        ("leaders", "Лучшие", 745, "left"),
+        ("median", "Медиана", 1040, "right"),
+        ("p90", "p90", 1120, "right")]
+    LEVEL_COLORS = [
+        (100, 220, 100),
+        (100, 180, 255),
+        (255, 180, 100),
+        (180, 180, 180),
+        (200, 150, 255)]
+
     def __init__(self):
         super().__init__()
-        self.save_data = SaveSystem.load_game_data()
+        self.save_repository = SaveRepository.get()
+        self.save_data = self.save_repository.data
         self.show_stats = False
         self.particle_system = ParticleSystem()
         self.sparkle_timer = 0
+        self.quality = None
+        self.background_layer = None
+        self.menu_layer = None
+        # Разметка текста и уровни для меню готовятся после первого кадра
+        # (warm_up) или когда меню придётся перерисовать
+        self.menu_text = None
+        self.stats_text = None
+        # Ключ меню и ключ файла кэша, если картинку при запуске надо сохранить
+        self.startup_cache = None
+        self.warmed_up = False
+        PROFILER.reset()
+        QUALITY.reset()
+
+    @classmethod
+    def layers(cls, window):
+        if cls._layers is None or cls._layers[0].ctx is not window.ctx:
+            cls._layers = (CachedLayer(window), CachedLayer(window))
+        return cls._layers
+
+    def build_text(self):
+        self.menu_text = TextCache()
+        self.stats_text = TextCache()
+        menu_text = self.menu_text
+        menu_text.add("title", "ПЕНТ:КИБЕРПУТЬ",
+                      SCREEN_WIDTH / 2, SCREEN_HEIGHT - 80,
+                      (0, 200, 255), 64,
+                      anchor_x="center",
+                      bold=True)
+        menu_text.add("subtitle", "Путешествие по 5 уникальным мирам",
+                      SCREEN_WIDTH / 2, SCREEN_HEIGHT - 130,
+                      (180, 220, 255), 24,
+                      anchor_x="center")
+        menu_text.add("worlds", "5 МИРОВ",
+                      SCREEN_WIDTH / 2, SCREEN_HEIGHT - 185,
+                      arcade.color.YELLOW, 28,
+                      anchor_x="center", bold=True)
+
+        level_width = 180
+        level_height = 100
+        level_spacing = 30
+        total_width = 5 * level_width + 4 * level_spacing
+        start_x = (SCREEN_WIDTH - total_width) // 2
+
+        for i in range(1, 6):
+            level = LEVELS[i]
+            x = start_x + (i - 1) * (level_width + level_spacing)
+            y = SCREEN_HEIGHT - 320
+            menu_text.add(f"level_{i}_number", f"{i}",
+                          x + level_width / 2, y + level_height - 20,
+                          self.LEVEL_COLORS[i - 1], 24,
+                          anchor_x="center", bold=True)
+            menu_text.add(f"level_{i}_name", f"{level['name']}",
+                          x + level_width / 2, y + level_height / 2,
+                          arcade.color.WHITE, 16,
+                          anchor_x="center", anchor_y="center")
+            details = f"{level['coins']} монет, {level['time']} сек"
+            menu_text.add(f"level_{i}_details", details,
+                          x + level_width / 2, y + 20,
+                          (200, 200, 200), 14,
+                          anchor_x="center")
+            menu_text.add(f"level_{i}_record", "",
+                          x + level_width / 2, y - 20,
+                          arcade.color.GOLD, 12,
+                          static=False, anchor_x="center")
+
+        menu_text.add("controls", "УПРАВЛЕНИЕ",
+                      SCREEN_WIDTH / 2, SCREEN_HEIGHT - 405,
+                      arcade.color.YELLOW, 28,
+                      anchor_x="center", bold=True)
+        cube_size = 120
+        cube_spacing = 40
+        controls_data = [
+            ("← →", "Движение"),
+            ("ПРОБЕЛ", "Прыжок"),
+            ("R", "Рестарт"),
+            ("ESC", "Меню")]
+
+        total_controls_width = 4 * cube_size + 3 * cube_spacing
+        controls_start_x = (SCREEN_WIDTH - total_controls_width) // 2
+        controls_y = SCREEN_HEIGHT - 540
+        for i, (key, desc) in enumerate(controls_data):
+            x = controls_start_x + i * (cube_size + cube_spacing)
+            menu_text.add(f"control_{i}_key", key,
+                          x + cube_size / 2, controls_y + cube_size - 35,
+                          (0, 200, 255), 28,
+                          anchor_x="center", bold=True)
+            menu_text.add(f"control_{i}_desc", desc,
+                          x + cube_size / 2, controls_y + 25,
+                          arcade.color.WHITE, 18,
+                          anchor_x="center")
+
+        center_y = SCREEN_HEIGHT - 650
+        menu_text.add("start", "СТАРТ",
+                      SCREEN_WIDTH / 2, center_y,
+                      arcade.color.WHITE, 40,
+                      anchor_x="center", anchor_y="center",
+                      bold=True)
+        menu_text.add("start_hint", "Нажмите ПРОБЕЛ или кликните СТАРТ",
+                      SCREEN_WIDTH / 2, 80,
+                      arcade.color.YELLOW, 24,
+                      anchor_x="center")
+        menu_text.add("stats_hint", "Нажмите S для просмотра статистики, G — случайные карты",
+                      SCREEN_WIDTH / 2, 40,
+                      (180, 180, 180), 18,
+                      anchor_x="center")
+        menu_text.add("progress", "",
+                      SCREEN_WIDTH - 200, SCREEN_HEIGHT - 50,
+                      (100, 200, 255), 20,
+                      static=False)
+        menu_text.add("quality", "",
+                      SCREEN_WIDTH - 15, 12,
+                      (150, 150, 180), 14,
+                      static=False, anchor_x="right")
+
+        self.stats_text.add("title", "СТАТИСТИКА",
+                            SCREEN_WIDTH / 2, 395,
+                            arcade.color.YELLOW, 32,
+                            anchor_x="center", bold=True)
+        for i in range(5):
+            self.stats_text.add(f"stat_{i}", "",
+                                90, 335 - i * 40,
+                                arcade.color.WHITE, 18,
+                                static=False)
+        # Таблица рекордов по уровням из журнала забегов
+        for key, title, x, anchor_x in self.LEADERBOARD_COLUMNS:
+            self.stats_text.add(f"board_{key}", title,
+                                x, 335,
+                                (100, 200, 255), 16,
+                                anchor_x=anchor_x, bold=True)
+            for i in range(1, 6):
+                self.stats_text.add(f"board_{key}_{i}", str(i) if key == "level" else "",
+                                    x, 335 - i * 36,
+                                    self.LEVEL_COLORS[i - 1] if key == "level" else arcade.color.WHITE,
+                                    16, static=key == "level", anchor_x=anchor_x)
+        self.stats_text.add("close_hint", "Нажмите S для закрытия статистики",
+                            SCREEN_WIDTH / 2, 65,
+                            (200, 200, 200), 20,
+                            anchor_x="center")
+
+    def update_text(self):
+        menu_text = self.menu_text
+        for i in range(1, 6):
+            color = self.LEVEL_COLORS[i - 1]
+            is_locked = i > self.save_data["max_level_reached"]
+            menu_text.update(f"level_{i}_number",
+                             color=color if not is_locked else (100, 100, 100))
+            menu_text.update(f"level_{i}_name",
+                             color=arcade.color.WHITE if not is_locked else (150, 150, 150))
+            menu_text.update(f"level_{i}_details",
+                             color=(200, 200, 200) if not is_locked else (100, 100, 100))
+            record = self.save_data["level_records"].get(str(i), 0)
+            menu_text.update(f"level_{i}_record",
+                             text=f"Рекорд: {record}",
+                             visible=record > 0 and not is_locked)
+
+        progress = self.save_data["max_level_reached"]
+        menu_text.update("start_hint", visible=not self.show_stats)
+        menu_text.update("stats_hint", visible=not self.show_stats)
+        menu_text.update("progress", text=f"Прогресс: {progress}/5",
+                         visible=not self.show_stats)
+        menu_text.update("quality", text=f"Качество: {QUALITY.describe()}, Q",
+                         visible=not self.show_stats)
+
+        if self.show_stats:
+            stats = [
+                f"Максимальный уровень: {self.save_data['max_level_reached']}/5",
+                f"Общий счет: {self.save_data['total_score']}",
+                f"Собрано монет: {self.save_data['total_coins']}",
+                f"Сыграно игр: {self.save_data['games_played']}",
+                f"Побед: {self.save_data['games_won']}"]
+            for i, stat in enumerate(stats):
+                self.stats_text.update(f"stat_{i}", text=stat)
+            for i in range(1, 6):
+                level_stats = self.save_repository.level_stats(i)
+                percentiles = level_stats.percentiles
+                columns = {
+                    "runs": str(level_stats.runs),
+                    "leaders": " · ".join(map(str, level_stats.leaders)) or "—",
+                    "median": str(percentiles.get(50, "—")),
+                    "p90": str(percentiles.get(90, "—"))}
+                for key, text in columns.items():
+                    self.stats_text.update(f"board_{key}_{i}", text=text)
 
     def on_show(self):
         arcade.set_background_color(BACKGROUND_COLOR)
 
     def on_draw(self):
         self.clear()
-        arcade.draw_lrbt_rectangle_filled(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT, BACKGROUND_COLOR)
-        for x in range(0, SCREEN_WIDTH, 60):
-            arcade.draw_line(x, 0, x, SCREEN_HEIGHT, (35, 35, 65), 1)
-            if random.random() < 0.01:
-                y = random.randint(0, SCREEN_HEIGHT)
-                self.particle_system.create_sparkle_effect(x, y)
+        PROFILER.begin("draw.menu")
+        # Меню перерисовывается в буфер только после изменения сохранения
+        # или переключения статистики
+        self.background_layer, self.menu_layer = self.layers(self.window)
+        if QUALITY.tier is not self.quality:
+            self.quality = QUALITY.tier
+            self.particle_system.budget = self.quality.particle_budget
+        if self.background_layer.key != self.quality.name:
+            self.background_layer.key = self.quality.name
+            self.background_layer.render(self.draw_background)
+        menu_key = (self.save_repository.revision, self.save_repository.history_revision,
+                    self.show_stats, QUALITY.describe())
+        if menu_key != self.menu_layer.key:
+            self.menu_layer.key = menu_key
+            self.render_menu()
+        self.background_layer.draw()
+        PROFILER.end("draw.menu")
+
+        PROFILER.begin("draw.particles")
         self.particle_system.draw()
-        arcade.draw_text("ПЕНТ:КИБЕРПУТЬ",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT - 80,
-                         (0, 200, 255), 64,
-                         anchor_x="center",
-                         bold=True)
-        arcade.draw_text("Путешествие по 5 уникальным мирам",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT - 130,
-                         (180, 220, 255), 24,
-                         anchor_x="center")
+        PROFILER.end("draw.particles")
+
+        PROFILER.begin("draw.menu")
+        self.menu_layer.draw()
+        PROFILER.end("draw.menu")
+
+        PROFILER.count("частицы", len(self.particle_system))
+        PROFILER.count("качество", QUALITY.describe())
+        PROFILER.draw()
+        PROFILER.end_frame()
+        QUALITY.end_frame()
+        if not STARTUP.done:
+            STARTUP.first_frame(self.window)
+            if STARTUP.enabled:
+                # Замер окончен: картинку меню всё же сохранить для
+                # следующего запуска, дождавшись записи
+                writer = self.save_startup_cache()
+                if writer is not None:
+                    writer.join()
+                self.window.close()
+                return
+        if not self.warmed_up:
+            self.warmed_up = True
+            arcade.schedule_once(self.warm_up, 0)
+
+    def save_startup_cache(self):
+        if self.startup_cache is None:
+            return None
+        menu_key, cache_key = self.startup_cache
+        self.startup_cache = None
+        # Меню могло уже смениться (S, другая ступень качества)
+        if self.menu_layer.key != menu_key:
+            return None
+        return self.menu_layer.save(self.MENU_CACHE_FILE, cache_key)
+
+    def warm_up(self, delta_time):
+        self.save_startup_cache()
+        if self.menu_text is None:
+            self.build_text()
+        for name in SpriteTextures.SIZES:
+            SpriteTextures.get(name)
+
+    def menu_cache_key(self):
+        key = json.dumps([self.MENU_CACHE_VERSION, self.window.get_framebuffer_size(),
+                          self.save_data, self.show_stats, QUALITY.describe(),
+                          LEVELS.signature()], sort_keys=True)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def render_menu(self):
+        # При запуске меню берётся готовой картинкой с прошлого раза: разметка
+        # и растеризация глифов — большая часть времени до первого кадра.
+        # Если картинка не подошла, новая сохраняется после первого кадра
+        # (warm_up), а не посреди отрисовки
+        if StartView._startup:
+            StartView._startup = False
+            cache_key = self.menu_cache_key()
+            if self.menu_layer.load(self.MENU_CACHE_FILE, cache_key):
+                return
+            self.startup_cache = (self.menu_layer.key, cache_key)
+        self.menu_layer.render(self.draw_menu)
+
+    def draw_background(self):
+        arcade.draw_lrbt_rectangle_filled(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT, BACKGROUND_COLOR)
+        if self.quality.grid:
+            for x in range(0, SCREEN_WIDTH, 60):
+                arcade.draw_line(x, 0, x, SCREEN_HEIGHT, (35, 35, 65), 1)
+
+    def draw_menu(self):
+        if self.menu_text is None:
+            self.build_text()
         arcade.draw_lrbt_rectangle_filled(
             30, SCREEN_WIDTH - 30,
                 SCREEN_HEIGHT - 230, SCREEN_HEIGHT - 170,
             (40, 50, 90, 200))
-        arcade.draw_text("5 МИРОВ",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT - 185,
-                         arcade.color.YELLOW, 28,
-                         anchor_x="center", bold=True)
-        level_colors = [
-            (100, 220, 100),
-            (100, 180, 255),
-            (255, 180, 100),
-            (180, 180, 180),
-            (200, 150, 255)]
 
         level_width = 180
         level_height = 100
@@ -432,8 +3014,7 @@ class StartView(arcade.View):
         start_x = (SCREEN_WIDTH - total_width) // 2
 
         for i in range(1, 6):
-            level = LEVELS[i]
-            color = level_colors[i - 1]
+            color = self.LEVEL_COLORS[i - 1]
             x = start_x + (i - 1) * (level_width + level_spacing)
             y = SCREEN_HEIGHT - 320
             is_locked = i > self.save_data["max_level_reached"]
@@ -451,47 +3032,18 @@ class StartView(arcade.View):
                 arcade.draw_lrbt_rectangle_outline(
                     x, x + level_width, y, y + level_height,
                     color, 3)
-            arcade.draw_text(f"{i}",
-                             x + level_width / 2, y + level_height - 20,
-                             color if not is_locked else (100, 100, 100), 24,
-                             anchor_x="center", bold=True)
-            arcade.draw_text(f"{level['name']}",
-                             x + level_width / 2, y + level_height / 2,
-                             arcade.color.WHITE if not is_locked else (150, 150, 150), 16,
-                             anchor_x="center", anchor_y="center")
-            details = f"{level['coins']} монет, {level['time']} сек"
-            arcade.draw_text(details,
-                             x + level_width / 2, y + 20,
-                             (200, 200, 200) if not is_locked else (100, 100, 100), 14,
-                             anchor_x="center")
-            record = self.save_data["level_records"].get(str(i), 0)
-            if record > 0 and not is_locked:
-                arcade.draw_text(f"Рекорд: {record}",
-                                 x + level_width / 2, y - 20,
-                                 arcade.color.GOLD, 12,
-                                 anchor_x="center")
 
         arcade.draw_lrbt_rectangle_filled(
             30, SCREEN_WIDTH - 30,
                 SCREEN_HEIGHT - 450, SCREEN_HEIGHT - 390,
             (40, 50, 90, 200))
 
-        arcade.draw_text("УПРАВЛЕНИЕ",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT - 405,
-                         arcade.color.YELLOW, 28,
-                         anchor_x="center", bold=True)
         cube_size = 120
         cube_spacing = 40
-        controls_data = [
-            ("← →", "Движение"),
-            ("ПРОБЕЛ", "Прыжок"),
-            ("R", "Рестарт"),
-            ("ESC", "Меню")]
-
         total_controls_width = 4 * cube_size + 3 * cube_spacing
         controls_start_x = (SCREEN_WIDTH - total_controls_width) // 2
         controls_y = SCREEN_HEIGHT - 540
-        for i, (key, desc) in enumerate(controls_data):
+        for i in range(4):
             x = controls_start_x + i * (cube_size + cube_spacing)
             arcade.draw_lrbt_rectangle_filled(
                 x, x + cube_size, controls_y, controls_y + cube_size,
@@ -504,14 +3056,6 @@ class StartView(arcade.View):
                 x, x + cube_size - 10,
                 controls_y, controls_y + 10,
                 (20, 40, 90))
-            arcade.draw_text(key,
-                             x + cube_size / 2, controls_y + cube_size - 35,
-                             (0, 200, 255), 28,
-                             anchor_x="center", bold=True)
-            arcade.draw_text(desc,
-                             x + cube_size / 2, controls_y + 25,
-                             arcade.color.WHITE, 18,
-                             anchor_x="center")
 
         center_y = SCREEN_HEIGHT - 650
         button_width, button_height = 300, 70
@@ -527,61 +3071,34 @@ class StartView(arcade.View):
             center_y - button_height / 2 - 5,
             center_y + button_height / 2 - 5,
             (0, 150, 80))
-        arcade.draw_text("СТАРТ",
-                         SCREEN_WIDTH / 2, center_y,
-                         arcade.color.WHITE, 40,
-                         anchor_x="center", anchor_y="center",
-                         bold=True)
+
+        self.update_text()
+        self.menu_text.draw()
         if self.show_stats:
             arcade.draw_lrbt_rectangle_filled(
-                100, SCREEN_WIDTH - 100,
-                100, 350,
-                (20, 30, 50, 230))
-            arcade.draw_text("СТАТИСТИКА",
-                             SCREEN_WIDTH / 2, 320,
-                             arcade.color.YELLOW, 32,
-                             anchor_x="center", bold=True)
-
-            stats = [
-                f"Максимальный уровень: {self.save_data['max_level_reached']}/5",
-                f"Общий счет: {self.save_data['total_score']}",
-                f"Собрано монет: {self.save_data['total_coins']}",
-                f"Сыграно игр: {self.save_data['games_played']}",
-                f"Побед: {self.save_data['games_won']}"]
-
-            for i, stat in enumerate(stats):
-                y_pos = 270 - i * 40
-                arcade.draw_text(stat,
-                                 SCREEN_WIDTH / 2, y_pos,
-                                 arcade.color.WHITE, 24,
-                                 anchor_x="center")
-            arcade.draw_text("Нажмите S для закрытия статистики",
-                             SCREEN_WIDTH / 2, 110,
-                             (200, 200, 200), 20,
-                             anchor_x="center")
-        else:
-            arcade.draw_text("Нажмите ПРОБЕЛ или кликните СТАРТ",
-                             SCREEN_WIDTH / 2, 80,
-                             arcade.color.YELLOW, 24,
-                             anchor_x="center")
-            arcade.draw_text("Нажмите S для просмотра статистики",
-                             SCREEN_WIDTH / 2, 40,
-                             (180, 180, 180), 18,
-                             anchor_x="center")
-            progress = self.save_data["max_level_reached"]
-            arcade.draw_text(f"Прогресс: {progress}/5",
-                             SCREEN_WIDTH - 200, SCREEN_HEIGHT - 50,
-                             (100, 200, 255), 20)
+                60, SCREEN_WIDTH - 60,
+                40, 450,
+                (20, 30, 50, 240))
+            self.stats_text.draw()
 
     def on_update(self, delta_time: float):
+        PROFILER.begin("particles.update")
         self.particle_system.update(delta_time)
+        PROFILER.end("particles.update")
+        rng = self.particle_system.effect_rng
+        sparkle_rate = QUALITY.tier.sparkle_rate
+        for x in range(0, SCREEN_WIDTH, 60):
+            if rng.random() < 0.01 * sparkle_rate:
+                y = rng.randint(0, SCREEN_HEIGHT)
+                self.particle_system.emit("sparkle", x, y)
         self.sparkle_timer += delta_time
         if self.sparkle_timer > 0.5:
             self.sparkle_timer = 0
-            if random.random() < 0.3:  # 30% шанс
-                x = random.randint(50, SCREEN_WIDTH - 50)
-                y = random.randint(50, SCREEN_HEIGHT - 50)
-                self.particle_system.create_sparkle_effect(x, y)
+            rng = self.particle_system.effect_rng
+            if rng.random() < 0.3 * sparkle_rate:  # 30% шанс
+                x = rng.randint(50, SCREEN_WIDTH - 50)
+                y = rng.randint(50, SCREEN_HEIGHT - 50)
+                self.particle_system.emit("sparkle", x, y)
 
     def on_mouse_press(self, x, y, button, modifiers):
         if self.show_stats:
@@ -610,529 +3127,495 @@ class StartView(arcade.View):
                 break
 
     def on_key_press(self, key, modifiers):
-        if key == arcade.key.SPACE or key == arcade.key.ENTER:
+        if key == arcade.key.F3:
+            PROFILER.toggle()
+        elif key == arcade.key.SPACE or key == arcade.key.ENTER:
             if not self.show_stats:
                 self.start_game()
         elif key == arcade.key.ESCAPE:
             arcade.close_window()
         elif key == arcade.key.S:
             self.show_stats = not self.show_stats
+        elif key == arcade.key.G:
+            if not self.show_stats:
+                self.start_game(procedural=True)
+        elif key == arcade.key.Q:
+            self.save_repository.set_quality(QUALITY.cycle())
         elif key == arcade.key.R and modifiers & arcade.key.MOD_CTRL:
-            self.save_data = SaveSystem.reset_save_data()
+            self.save_data = self.save_repository.reset()
+            QUALITY.pin(self.save_data["quality"])
 
-    def start_game(self, level_num=1):
-        game_view = GameView()
-        game_view.level = level_num
-        game_view.load_level(level_num)
+    def start_game(self, level_num=1, procedural=False):
+        game_view = GameView(level_num, procedural=procedural)
         self.window.show_view(game_view)
 
 
 class GameView(arcade.View):
-    def __init__(self):
+    # Статический слой каждого уровня, общий для всех экземпляров GameView:
+    # номер уровня -> ((вариант случайной карты или None, сетка), слой)
+    static_layer_cache = {}
+
+    def __init__(self, level=1, seed=None, session=None, procedural=False):
         super().__init__()
-        self.player_x = SCREEN_WIDTH // 4
-        self.player_y = SCREEN_HEIGHT // 2
-        self.player_dx = 0
-        self.player_dy = 0
-        self.jumping = False
-        self.was_jumping = False
-        self.coins = []
-        self.enemies = []
-        self.hazards = []
-        self.platforms = []
-        self.score = 0
-        self.coins_collected = 0
-        self.total_coins = 0
-        self.level = 1
-        self.time_left = 0
-        self.game_over = False
-        self.level_complete = False
-        self.lives = 3
-        self.last_enemy_collision_time = 0
-        self.collision_cooldown = 0.5
-        self.life_restored_this_level = False
-        self.particle_system = ParticleSystem()
-        self.save_data = SaveSystem.load_game_data()
+        self.particle_system = ParticleSystem(seed=seed)
+        self.save_repository = SaveRepository.get()
+        self.save_data = self.save_repository.data
         self.background_effect_timer = 0
-        self.load_level(self.level)
-
-    def load_level(self, level_num):
-        if level_num not in LEVELS:
-            self.level_complete = True
-            self.game_over = True
-            return
-
-        level_data = LEVELS[level_num]
-
-        self.player_x = 200
-        self.player_y = 300
-        self.player_dx = 0
-        self.player_dy = 0
-        self.jumping = False
-        self.was_jumping = False
-        self.coins_collected = 0
-        self.platforms = []
-        for plat in level_data["platforms"]:
-            self.platforms.append(plat)
-        self.coins = []
-        self.total_coins = level_data["coins"]
-
-        for i in range(self.total_coins):
-            if self.platforms:
-                plat_index = i % len(self.platforms)
-                plat = self.platforms[plat_index]
-                segments = min(2, self.total_coins // len(self.platforms) + 1)
-                segment = (i // len(self.platforms)) % segments
-                x = plat[0] + plat[2] * (segment + 1) / (segments + 1)
-                y = plat[1] + plat[3] + 35
-            else:
-                x = random.randint(100, SCREEN_WIDTH - 100)
-                y = random.randint(200, SCREEN_HEIGHT - 100)
-
-            self.coins.append({
-                "x": x,
-                "y": y,
-                "collected": False,
-                "rotation": random.random() * 6.28,
-                "bounce": random.random() * 6.28})
-
-        self.enemies = []
-        for i in range(level_data["enemies"]):
-            if self.platforms[1:]:
-                plat = random.choice(self.platforms[1:])
-                x = plat[0] + plat[2] * 0.5
-                y = plat[1] + plat[3] + ENEMY_SIZE / 2 + 5
-            else:
-                x = random.randint(100, SCREEN_WIDTH - 100)
-                y = 200
-
-            self.enemies.append({
-                "x": x,
-                "y": y,
-                "dx": random.choice([-1.5, 1.5])})
-        self.hazards = []
-        for i in range(level_data["hazards"]):
-            if random.random() > 0.4:
-                x = random.randint(100, SCREEN_WIDTH - 100)
-                y = 140
-            else:
-                if len(self.platforms) > 2:
-                    plat1, plat2 = random.sample(self.platforms[1:], 2)
-                    x = (plat1[0] + plat2[0] + plat2[2] / 2) / 2
-                    y = (plat1[1] + plat2[1]) / 2
-                else:
-                    x = random.randint(100, SCREEN_WIDTH - 100)
-                    y = random.randint(200, 400)
-
-            self.hazards.append({
-                "x": x,
-                "y": y,
-                "rotation": 0,
-                "pulse": random.random() * 6.28})
-        self.time_left = level_data["time"]
-
-        self.game_over = False
-        self.level_complete = False
-        self.last_enemy_collision_time = 0
-        self.life_restored_this_level = False
-
-        if level_num > 1 and self.lives < 3:
-            if not self.life_restored_this_level:
-                self.lives += 1
-                self.life_restored_this_level = True
-                self.score += 25
+        self.pending_input = StepInput()
+        self.accumulator = 0.0
+        # Запись или повтор ввода (InputRecorder / InputReplay)
+        self.session = session
+        self.tick = 0
+        enemy_texture = SpriteTextures.get("enemy")
+        self.enemy_textures = (enemy_texture, enemy_texture.flip_left_right())
+        self.player_sprite = arcade.Sprite(SpriteTextures.get("player"))
+        self.player_sprites = arcade.SpriteList()
+        self.player_sprites.append(self.player_sprite)
+        self.camera = arcade.camera.Camera2D()
+        self.build_text()
+        PROFILER.reset()
+        QUALITY.reset()
+        self.quality = QUALITY.tier
+        self.particle_system.budget = self.quality.particle_budget
+        self.coin_texture = SpriteTextures.get("coin" if self.quality.coin_detail else "coin_plain")
+        self.generator = LevelPrefetcher(LevelGenerator(seed)) if procedural else None
+        self.state = GameState(level, seed, self.generator)
+        self.handle_events()
+
+    def on_hide_view(self):
+        if self.generator is not None:
+            self.generator.close()
+
+    def handle_events(self):
+        state = self.state
+        for kind, x, y in state.drain_events():
+            if kind in ParticleSystem.EFFECTS:
+                # За пределами видимой области частицы не нужны
+                left, right = state.active_range()
+                if left < x < right:
+                    self.particle_system.emit(kind, x, y)
+            elif kind == "level_loaded":
+                self.load_static_layer(state.level)
+                self.build_sprites()
+            elif kind == "run_finished":
+                PROFILER.begin("save")
+                self.save_repository.record_run(state.level, state.score, state.coins_collected,
+                                                state.time_left, state.lives,
+                                                state.level_complete)
+                PROFILER.end("save")
+                if state.level_complete and self.quality.celebration:
+                    self.particle_system.emit("level_complete",
+                                              state.camera_x + SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+
+    def build_sprites(self):
+        # Спрайты идут в том же порядке, что и строки CoinStore/EnemyStore
+        state = self.state
+        self.coin_sprites = arcade.SpriteList()
+        for x, y in zip(state.coins.x.tolist(), state.coins.y.tolist()):
+            self.coin_sprites.append(arcade.Sprite(self.coin_texture, center_x=x, center_y=y))
+        self.enemy_sprites = arcade.SpriteList()
+        for x, y in zip(state.enemies.x.tolist(), state.enemies.y.tolist()):
+            self.enemy_sprites.append(arcade.Sprite(self.enemy_textures[0], center_x=x, center_y=y))
+        # Какие спрайты сейчас показаны: на кадре видимость меняется
+        # только у тех, кто вошёл в кадр или вышел из него
+        self.coins_shown = np.ones(len(state.coins), dtype=bool)
+        self.enemies_shown = np.ones(len(state.enemies), dtype=bool)
 
-                self.particle_system.add_particle(
-                    self.player_x, self.player_y,
-                    color=(100, 255, 100),
-                    count=15,
-                    speed=2.0,
-                    size=4.0,
-                    lifetime=1.0,
-                    fade_out=True,
-                    gravity_effect=0.3)
+    @staticmethod
+    def show_sprites(sprites, shown, visible):
+        for index in np.flatnonzero(shown != visible).tolist():
+            sprites[index].visible = bool(visible[index])
+        shown[:] = visible
+
+    def load_static_layer(self, level_num):
+        key = (self.state.level_data.get("variant"), self.quality.grid)
+        cached = self.static_layer_cache.get(level_num)
+        if cached is None or cached[0] != key:
+            cached = self.static_layer_cache[level_num] = (key, self.build_static_layer())
+        self.static_layer = cached[1]
+
+    def apply_quality(self):
+        self.quality = QUALITY.tier
+        self.particle_system.budget = self.quality.particle_budget
+        self.coin_texture = SpriteTextures.get("coin" if self.quality.coin_detail else "coin_plain")
+        for sprite in self.coin_sprites:
+            sprite.texture = self.coin_texture
+        self.load_static_layer(self.state.level)
+
+    def build_static_layer(self):
+        # Фон, сетка и платформы не меняются после load_level —
+        # собираем их один раз в ShapeElementList
+        static_layer = arcade.shape_list.ShapeElementList()
+        level_color = self.state.level_data.get("background", BACKGROUND_COLOR)
+        world_width = self.state.world_width
+        static_layer.append(arcade.shape_list.create_rectangle_filled(
+            world_width / 2, SCREEN_HEIGHT / 2, world_width, SCREEN_HEIGHT, level_color))
+
+        if self.quality.grid:
+            grid_points = []
+            for x in range(0, world_width, 60):
+                grid_points.append((x, 0))
+                grid_points.append((x, SCREEN_HEIGHT))
+            static_layer.append(arcade.shape_list.create_lines(grid_points, (35, 35, 65)))
+        for plat in self.state.platforms:
+            x, y, width, height = plat
+            static_layer.append(arcade.shape_list.create_rectangle_filled(
+                x + width / 2, y + height / 2, width, height, PLATFORM_COLOR))
+            static_layer.append(arcade.shape_list.create_rectangle_outline(
+                x + width / 2, y + height / 2, width, height, arcade.color.BLACK, 2))
+        return static_layer
 
     def on_draw(self):
         self.clear()
-        level_color = LEVELS.get(self.level, {}).get("background", BACKGROUND_COLOR)
-        arcade.draw_lrbt_rectangle_filled(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT, level_color)
-
-        for x in range(0, SCREEN_WIDTH, 60):
-            arcade.draw_line(x, 0, x, SCREEN_HEIGHT, (35, 35, 65), 1)
-        for plat in self.platforms:
-            x, y, width, height = plat
-            arcade.draw_lrbt_rectangle_filled(x, x + width, y, y + height, PLATFORM_COLOR)
-            arcade.draw_lrbt_rectangle_outline(x, x + width, y, y + height, arcade.color.BLACK, 2)
-
-        for hazard in self.hazards:
-            x, y = hazard["x"], hazard["y"]
-            rotation = hazard["rotation"]
-            pulse = math.sin(hazard["pulse"]) * 0.2 + 0.8
-
-            points = []
-            for i in range(6):
-                angle = i * math.pi / 3 + rotation
-                radius = HAZARD_HEIGHT * pulse if i % 2 == 0 else HAZARD_HEIGHT * 0.5 * pulse
-                px = x + math.cos(angle) * radius
-                py = y + math.sin(angle) * radius
-                points.append((px, py))
-            arcade.draw_polygon_filled(points, HAZARD_COLOR)
-            arcade.draw_circle_filled(x, y, HAZARD_HEIGHT * 0.3, (200, 80, 0))
-
-        for enemy in self.enemies:
-            x, y = enemy["x"], enemy["y"]
-            arcade.draw_circle_filled(x, y, ENEMY_SIZE / 2, ENEMY_COLOR)
-
-            eye_direction = 1 if enemy["dx"] > 0 else -1
-            arcade.draw_circle_filled(x + 10 * eye_direction, y + 8, 8, arcade.color.WHITE)
-            arcade.draw_circle_filled(x - 10 * eye_direction, y + 8, 8, arcade.color.WHITE)
-            arcade.draw_circle_filled(x + 10 * eye_direction, y + 8, 4, arcade.color.BLACK)
-            arcade.draw_circle_filled(x - 10 * eye_direction, y + 8, 4, arcade.color.BLACK)
-
-            arcade.draw_arc_outline(x, y - 5, 15, 10, arcade.color.BLACK, 0, 180, 3)
-
-        for coin in self.coins:
-            if not coin["collected"]:
-                x, y = coin["x"], coin["y"]
-                rotation = coin["rotation"]
-                bounce = math.sin(coin["bounce"]) * 3
-                arcade.draw_circle_filled(x, y + bounce, COIN_SIZE, COIN_COLOR)
-                arcade.draw_circle_filled(x, y + bounce, COIN_SIZE * 0.7, (255, 235, 100))
-                blink_x = x + math.cos(rotation) * COIN_SIZE * 0.4
-                blink_y = y + bounce + math.sin(rotation) * COIN_SIZE * 0.4
-                arcade.draw_circle_filled(blink_x, blink_y, COIN_SIZE * 0.3, (255, 255, 255, 200))
-                arcade.draw_circle_outline(x, y + bounce, COIN_SIZE, (200, 170, 0), 2)
-
-        arcade.draw_lrbt_rectangle_filled(
-            self.player_x - PLAYER_SIZE / 2,
-            self.player_x + PLAYER_SIZE / 2,
-            self.player_y - PLAYER_SIZE / 2,
-            self.player_y + PLAYER_SIZE / 2,
-            PLAYER_COLOR)
-
-        arcade.draw_circle_filled(self.player_x, self.player_y + PLAYER_SIZE * 0.3,
-                                  PLAYER_SIZE * 0.4, (50, 100, 200))
-        arcade.draw_circle_filled(self.player_x + 8, self.player_y + PLAYER_SIZE * 0.3 + 5,
-                                  5, arcade.color.WHITE)
-        arcade.draw_circle_filled(self.player_x - 8, self.player_y + PLAYER_SIZE * 0.3 + 5,
-                                  5, arcade.color.WHITE)
-        arcade.draw_circle_filled(self.player_x + 8, self.player_y + PLAYER_SIZE * 0.3 + 5,
-                                  2, arcade.color.BLACK)
-        arcade.draw_circle_filled(self.player_x - 8, self.player_y + PLAYER_SIZE * 0.3 + 5,
-                                  2, arcade.color.BLACK)
-        arcade.draw_arc_outline(
-            self.player_x,
-            self.player_y + PLAYER_SIZE * 0.3 - 8,
-            10, 6,
-            arcade.color.BLACK, 0, 180, 2)
-
+        state = self.state
+        # Доля ещё не просимулированного тика: рисуем между двумя состояниями
+        alpha = self.accumulator / SIMULATION_DT
+        player_x = state.prev_player_x + (state.player_x - state.prev_player_x) * alpha
+        player_y = state.prev_player_y + (state.player_y - state.prev_player_y) * alpha
+        camera_x = state.camera_left(player_x, state.world_width)
+        self.camera.position = (camera_x + SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+        self.camera.use()
+        # Объекты мира рисуются, только если попадают в кадр с запасом
+        view_left = camera_x - CULL_MARGIN
+        view_right = camera_x + SCREEN_WIDTH + CULL_MARGIN
+        spatial_hash = state.spatial_hash
+
+        PROFILER.begin("draw.static")
+        self.static_layer.draw()
+        PROFILER.end("draw.static")
+
+        PROFILER.begin("draw.hazards")
+        hazards = spatial_hash.query_kind("hazard", view_left, 0, view_right, SCREEN_HEIGHT)
+        HazardRenderer.shared().draw(state.hazards, hazards)
+        PROFILER.end("draw.hazards")
+
+        PROFILER.begin("draw.enemies")
+        enemies = state.enemies
+        enemy_x = enemies.prev_x + (enemies.x - enemies.prev_x) * alpha
+        enemy_y = enemies.prev_y + (enemies.y - enemies.prev_y) * alpha
+        visible = (enemy_x > view_left) & (enemy_x < view_right)
+        self.show_sprites(self.enemy_sprites, self.enemies_shown, visible)
+        enemy_textures = self.enemy_textures
+        enemy_sprites = self.enemy_sprites
+        for index in np.flatnonzero(visible).tolist():
+            sprite = enemy_sprites[index]
+            sprite.position = (enemy_x[index].item(), enemy_y[index].item())
+            sprite.texture = enemy_textures[bool(enemies.dx[index] <= 0)]
+        enemy_sprites.draw(pixelated=True)
+        PROFILER.end("draw.enemies")
+
+        PROFILER.begin("draw.coins")
+        coins = state.coins
+        # Собранные монеты уже убраны из сетки
+        index = np.array(spatial_hash.query_kind("coin", view_left, 0, view_right, SCREEN_HEIGHT),
+                         dtype=np.intp)
+        visible = np.zeros(len(coins), dtype=bool)
+        visible[index] = True
+        self.show_sprites(self.coin_sprites, self.coins_shown, visible)
+        # Угол спрайта в arcade отсчитывается по часовой стрелке
+        coin_y = coins.hit_y(index)
+        coin_angle = np.degrees(-coins.rotation[index])
+        coin_sprites = self.coin_sprites
+        for i, y, angle in zip(index.tolist(), coin_y.tolist(), coin_angle.tolist()):
+            sprite = coin_sprites[i]
+            sprite.center_y = y
+            sprite.angle = angle
+        coin_sprites.draw(pixelated=True)
+        PROFILER.end("draw.coins")
+
+        PROFILER.begin("draw.player")
+        self.player_sprite.position = (player_x, player_y)
+        self.player_sprites.draw(pixelated=True)
+        PROFILER.end("draw.player")
+
+        PROFILER.begin("draw.particles")
         self.particle_system.draw()
+        PROFILER.end("draw.particles")
+
+        PROFILER.begin("draw.ui")
+        self.window.default_camera.use()
         self.draw_ui()
-        if self.game_over:
+        if state.game_over:
             self.draw_game_over_screen()
 
-        if self.level_complete:
+        if state.level_complete:
             self.draw_level_complete_screen()
+        PROFILER.end("draw.ui")
+
+        PROFILER.count("частицы", len(self.particle_system))
+        PROFILER.count("монеты", len(state.coins) - state.coins_collected)
+        PROFILER.count("враги", len(state.enemies))
+        PROFILER.count("шипы", len(state.hazards))
+        PROFILER.count("качество", QUALITY.describe())
+        PROFILER.draw()
+        PROFILER.end_frame()
+        QUALITY.end_frame()
+
+    def build_text(self):
+        self.hud_text = TextCache()
+        self.game_over_text = TextCache()
+        self.level_complete_text = TextCache()
+
+        hud_text = self.hud_text
+        hud_text.add("level", "",
+                     20, SCREEN_HEIGHT - 40,
+                     arcade.color.WHITE, 22,
+                     static=False)
+        hud_text.add("coins", "",
+                     20, SCREEN_HEIGHT - 70,
+                     arcade.color.GOLD, 20,
+                     static=False)
+        hud_text.add("score", "",
+                     SCREEN_WIDTH - 200, SCREEN_HEIGHT - 40,
+                     arcade.color.WHITE, 22,
+                     static=False)
+        hud_text.add("record", "",
+                     SCREEN_WIDTH - 200, SCREEN_HEIGHT - 70,
+                     arcade.color.GOLD, 18,
+                     static=False)
+        hud_text.add("time", "",
+                     SCREEN_WIDTH / 2, SCREEN_HEIGHT - 55,
+                     arcade.color.WHITE, 20,
+                     static=False, anchor_x="center")
+        for i in range(3):
+            heart_x = SCREEN_WIDTH - 350 - i * 35
+            heart_y = SCREEN_HEIGHT - 50
+            hud_text.add(f"heart_{i}", "♥", heart_x, heart_y, arcade.color.RED, 26,
+                         static=False)
+        hud_text.add("hint", "ESC: Меню  R: Рестарт  Q: Качество",
+                     SCREEN_WIDTH / 2, 20,
+                     (200, 200, 200), 18,
+                     anchor_x="center")
+
+        game_over_text = self.game_over_text
+        game_over_text.add("title", "ИГРА ОКОНЧЕНА",
+                           SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 50,
+                           arcade.color.RED, 60,
+                           anchor_x="center", bold=True)
+        game_over_text.add("score", "",
+                           SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2,
+                           arcade.color.WHITE, 40,
+                           static=False, anchor_x="center")
+        game_over_text.add("new_game", "Нажмите ПРОБЕЛ для новой игры",
+                           SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 60,
+                           arcade.color.YELLOW, 26,
+                           anchor_x="center")
+        game_over_text.add("menu", "Нажмите ESC для выхода в меню",
+                           SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 100,
+                           arcade.color.WHITE, 22,
+                           anchor_x="center")
+
+        # Все варианты подписей экрана победы создаются заранее,
+        # на кадре переключается только их видимость
+        level_complete_text = self.level_complete_text
+        level_complete_text.add("title", "УРОВЕНЬ ПРОЙДЕН!",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 50,
+                                arcade.color.GREEN, 60,
+                                anchor_x="center", bold=True)
+        level_complete_text.add("coins", "",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2,
+                                arcade.color.GOLD, 40,
+                                static=False, anchor_x="center")
+        level_complete_text.add("life_restored", "Жизнь восстановлена! (+1 ♥)",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 40,
+                                (100, 255, 100), 28,
+                                anchor_x="center")
+        level_complete_text.add("next_after_life", "",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 90,
+                                arcade.color.CYAN, 30,
+                                static=False, anchor_x="center")
+        level_complete_text.add("continue_after_life", "Нажмите ПРОБЕЛ для продолжения",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 140,
+                                arcade.color.YELLOW, 26,
+                                anchor_x="center")
+        level_complete_text.add("next", "",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 60,
+                                arcade.color.CYAN, 30,
+                                static=False, anchor_x="center")
+        level_complete_text.add("continue", "Нажмите ПРОБЕЛ для продолжения",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 120,
+                                arcade.color.YELLOW, 26,
+                                anchor_x="center")
+        level_complete_text.add("all_done", "ВЫ ПРОШЛИ ВСЕ УРОВНИ!",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 60,
+                                arcade.color.GOLD, 40,
+                                anchor_x="center", bold=True)
+        level_complete_text.add("new_game", "Нажмите ПРОБЕЛ для новой игры",
+                                SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 120,
+                                arcade.color.YELLOW, 26,
+                                anchor_x="center")
 
     def draw_ui(self):
         arcade.draw_lrbt_rectangle_filled(
             0, SCREEN_WIDTH, SCREEN_HEIGHT - 70, SCREEN_HEIGHT,
             (0, 0, 0, 180))
 
-        level_name = LEVELS.get(self.level, {}).get("name", "Неизвестный уровень")
-        arcade.draw_text(f"Уровень {self.level}: {level_name}",
-                         20, SCREEN_HEIGHT - 40,
-                         arcade.color.WHITE, 22)
-        arcade.draw_text(f"Монеты: {self.coins_collected}/{self.total_coins}",
-                         20, SCREEN_HEIGHT - 70,
-                         arcade.color.GOLD, 20)
-        arcade.draw_text(f"Очки: {self.score}",
-                         SCREEN_WIDTH - 200, SCREEN_HEIGHT - 40,
-                         arcade.color.WHITE, 22)
-        record = self.save_data["level_records"].get(str(self.level), 0)
-        if record > 0:
-            arcade.draw_text(f"Рекорд: {record}",
-                             SCREEN_WIDTH - 200, SCREEN_HEIGHT - 70,
-                             arcade.color.GOLD, 18)
-
-        minutes = int(self.time_left) // 60
-        seconds = int(self.time_left) % 60
+        state = self.state
+        hud_text = self.hud_text
+        level_name = state.level_data.get("name", "Неизвестный уровень")
+        hud_text.update("level", text=f"Уровень {state.level}: {level_name}")
+        hud_text.update("coins", text=f"Монеты: {state.coins_collected}/{state.total_coins}")
+        hud_text.update("score", text=f"Очки: {state.score}")
+        record = self.save_data["level_records"].get(str(state.level), 0)
+        hud_text.update("record", text=f"Рекорд: {record}", visible=record > 0)
+
+        minutes = int(state.time_left) // 60
+        seconds = int(state.time_left) % 60
         time_color = arcade.color.WHITE
-        if self.time_left < 30:
+        if state.time_left < 30:
             time_color = arcade.color.RED
-        arcade.draw_text(f"Время: {minutes:02d}:{seconds:02d}",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT - 55,
-                         time_color, 20,
-                         anchor_x="center")
+        hud_text.update("time", text=f"Время: {minutes:02d}:{seconds:02d}", color=time_color)
         for i in range(3):
-            heart_x = SCREEN_WIDTH - 350 - i * 35
-            heart_y = SCREEN_HEIGHT - 50
-            if i < self.lives:
-                arcade.draw_text("♥", heart_x, heart_y, arcade.color.RED, 26)
+            if i < state.lives:
+                hud_text.update(f"heart_{i}", text="♥", color=arcade.color.RED)
             else:
-                arcade.draw_text("♡", heart_x, heart_y, (100, 100, 100), 26)
-        arcade.draw_text("ESC: Меню  R: Рестарт",
-                         SCREEN_WIDTH / 2, 20,
-                         (200, 200, 200), 18,
-                         anchor_x="center")
+                hud_text.update(f"heart_{i}", text="♡", color=(100, 100, 100))
+        hud_text.draw()
 
     def draw_game_over_screen(self):
         arcade.draw_lrbt_rectangle_filled(
             0, SCREEN_WIDTH, 0, SCREEN_HEIGHT,
             (0, 0, 0, 180))
-        arcade.draw_text("ИГРА ОКОНЧЕНА",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 50,
-                         arcade.color.RED, 60,
-                         anchor_x="center", bold=True)
-        arcade.draw_text(f"Счет: {self.score}",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2,
-                         arcade.color.WHITE, 40,
-                         anchor_x="center")
-        SaveSystem.update_level_record(self.level, self.score, self.coins_collected)
-        arcade.draw_text("Нажмите ПРОБЕЛ для новой игры",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 60,
-                         arcade.color.YELLOW, 26,
-                         anchor_x="center")
-        arcade.draw_text("Нажмите ESC для выхода в меню",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 100,
-                         arcade.color.WHITE, 22,
-                         anchor_x="center")
+        self.game_over_text.update("score", text=f"Счет: {self.state.score}")
+        self.game_over_text.draw()
 
     def draw_level_complete_screen(self):
         arcade.draw_lrbt_rectangle_filled(
             0, SCREEN_WIDTH, 0, SCREEN_HEIGHT,
             (0, 50, 0, 180))
-        arcade.draw_text("УРОВЕНЬ ПРОЙДЕН!",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 50,
-                         arcade.color.GREEN, 60,
-                         anchor_x="center", bold=True)
-        arcade.draw_text(f"Собрано монет: {self.coins_collected}/{self.total_coins}",
-                         SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2,
-                         arcade.color.GOLD, 40,
-                         anchor_x="center")
-        SaveSystem.update_level_record(self.level, self.score, self.coins_collected)
-
-        if not hasattr(self, 'completion_effect_created'):
-            self.particle_system.create_level_complete_effect(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
-            self.completion_effect_created = True
-        if self.level < len(LEVELS) and self.life_restored_this_level and self.lives <= 3:
-            arcade.draw_text(f"Жизнь восстановлена! (+1 ♥)",
-                             SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 40,
-                             (100, 255, 100), 28,
-                             anchor_x="center")
-            next_level = LEVELS.get(self.level + 1, {})
-            arcade.draw_text(f"Следующий: {next_level.get('name', '')}",
-                             SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 90,
-                             arcade.color.CYAN, 30,
-                             anchor_x="center")
-            arcade.draw_text("Нажмите ПРОБЕЛ для продолжения",
-                             SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 140,
-                             arcade.color.YELLOW, 26,
-                             anchor_x="center")
-        elif self.level < len(LEVELS):
-            next_level = LEVELS.get(self.level + 1, {})
-            arcade.draw_text(f"Следующий: {next_level.get('name', '')}",
-                             SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 60,
-                             arcade.color.CYAN, 30,
-                             anchor_x="center")
-            arcade.draw_text("Нажмите ПРОБЕЛ для продолжения",
-                             SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 120,
-                             arcade.color.YELLOW, 26,
-                             anchor_x="center")
-        else:
-            arcade.draw_text("ВЫ ПРОШЛИ ВСЕ УРОВНИ!",
-                             SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 60,
-                             arcade.color.GOLD, 40,
-                             anchor_x="center", bold=True)
-            arcade.draw_text("Нажмите ПРОБЕЛ для новой игры",
-                             SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 120,
-                             arcade.color.YELLOW, 26,
-                             anchor_x="center")
+
+        state = self.state
+        text = self.level_complete_text
+        text.update("coins", text=f"Собрано монет: {state.coins_collected}/{state.total_coins}")
+        has_next = state.level < len(LEVELS)
+        life_restored = has_next and state.life_restored_this_level and state.lives <= 3
+        next_name = f"Следующий: {LEVELS.get(state.level + 1, {}).get('name', '')}"
+        text.update("life_restored", visible=life_restored)
+        text.update("next_after_life", text=next_name, visible=life_restored)
+        text.update("continue_after_life", visible=life_restored)
+        text.update("next", text=next_name, visible=has_next and not life_restored)
+        text.update("continue", visible=has_next and not life_restored)
+        text.update("all_done", visible=not has_next)
+        text.update("new_game", visible=not has_next)
+        text.draw()
 
     def on_update(self, delta_time):
-        self.last_enemy_collision_time += delta_time
+        if QUALITY.tier is not self.quality:
+            self.apply_quality()
+        PROFILER.begin("particles.update")
         self.particle_system.update(delta_time)
+        PROFILER.end("particles.update")
         self.background_effect_timer += delta_time
         if self.background_effect_timer > 0.2:
             self.background_effect_timer = 0
-            if random.random() < 0.1:  # 10% шанс
-                x = random.randint(0, SCREEN_WIDTH)
-                y = random.randint(0, SCREEN_HEIGHT)
-                self.particle_system.create_sparkle_effect(x, y)
-
-        if self.game_over or self.level_complete:
-            for coin in self.coins:
-                coin["rotation"] += delta_time * 2
-                coin["bounce"] += delta_time * 1.5
-            for hazard in self.hazards:
-                hazard["rotation"] += delta_time * 2
-                hazard["pulse"] += delta_time * 3
-            return
-
-        self.time_left -= delta_time
-        if self.time_left <= 0:
-            self.game_over = True
-            return
-
-        self.player_dy -= GRAVITY
-        old_player_y = self.player_y
-        self.player_x += self.player_dx
-        self.player_y += self.player_dy
-
-        if old_player_y > self.player_y and not self.jumping:
-            self.was_jumping = True
-
-        if self.player_x < PLAYER_SIZE / 2:
-            self.player_x = PLAYER_SIZE / 2
-        if self.player_x > SCREEN_WIDTH - PLAYER_SIZE / 2:
-            self.player_x = SCREEN_WIDTH - PLAYER_SIZE / 2
-        if self.level >= 3:
-            if self.player_y < -100:
-                self.lives = 0
-                self.game_over = True
-                return
-        else:
-            if self.player_y < PLAYER_SIZE / 2:
-                self.player_y = PLAYER_SIZE / 2
-                self.player_dy = 0
-                self.jumping = False
-
-        if self.player_y > SCREEN_HEIGHT - PLAYER_SIZE / 2:
-            self.player_y = SCREEN_HEIGHT - PLAYER_SIZE / 2
-            self.player_dy = 0
-
-        was_in_air = self.jumping
-        self.jumping = True
-        player_radius = PLAYER_SIZE / 2
-        for plat in self.platforms:
-            plat_x, plat_y, plat_w, plat_h = plat
-            player_left = self.player_x - player_radius
-            player_right = self.player_x + player_radius
-            player_top = self.player_y + player_radius
-            player_bottom = self.player_y - player_radius
-            if (player_right > plat_x and
-                    player_left < plat_x + plat_w and
-                    player_bottom < plat_y + plat_h and
-                    player_top > plat_y and
-                    self.player_dy <= 0):
-
-                self.player_y = plat_y + plat_h + player_radius
-                self.player_dy = 0
-                self.jumping = False
-                if was_in_air and self.was_jumping:
-                    self.particle_system.create_landing_effect(self.player_x, self.player_y)
-                    self.was_jumping = False
-                break
-
-        for coin in self.coins:
-            if not coin["collected"]:
-                dx = coin["x"] - self.player_x
-                dy = coin["y"] + math.sin(coin["bounce"]) * 3 - self.player_y
-                distance = math.sqrt(dx * dx + dy * dy)
-                if distance < (COIN_SIZE + player_radius):
-                    coin["collected"] = True
-                    self.coins_collected += 1
-                    self.score += 100
-                    # Эффект сбора монеты
-                    self.particle_system.create_coin_effect(coin["x"], coin["y"])
-
-        if all(coin["collected"] for coin in self.coins):
-            self.level_complete = True
-            bonus = int(self.time_left) * 10
-            self.score += bonus
-            return
-
-        for enemy in self.enemies:
-            enemy["x"] += enemy["dx"]
-
-            if enemy["x"] < ENEMY_SIZE / 2 or enemy["x"] > SCREEN_WIDTH - ENEMY_SIZE / 2:
-                enemy["dx"] *= -1
-
-            dx = enemy["x"] - self.player_x
-            dy = enemy["y"] - self.player_y
-            distance = math.sqrt(dx * dx + dy * dy)
-
-            if distance < (ENEMY_SIZE / 2 + player_radius):
-                if self.last_enemy_collision_time > self.collision_cooldown:
-                    self.lives -= 1
-                    self.last_enemy_collision_time = 0
-                    self.particle_system.create_enemy_hit_effect(self.player_x, self.player_y)
-                    knockback = 3
-                    self.player_dx = -knockback if dx > 0 else knockback
-                    self.player_dy = knockback * 0.3
-
-                    if self.lives <= 0:
-                        self.game_over = True
-
-        for hazard in self.hazards:
-            dx = hazard["x"] - self.player_x
-            dy = hazard["y"] - self.player_y
-            distance = math.sqrt(dx * dx + dy * dy)
-            hazard_radius = HAZARD_HEIGHT
-            if distance < (hazard_radius + player_radius):
-                self.lives -= 1
-                self.particle_system.create_hazard_effect(self.player_x, self.player_y)
-                knockback = 8
-                self.player_dx = -knockback if dx > 0 else knockback
-                self.player_dy = knockback * 0.4
-                if self.lives <= 0:
-                    self.game_over = True
+            rng = self.particle_system.effect_rng
+            if rng.random() < 0.1 * self.quality.sparkle_rate:  # 10% шанс
+                x = self.state.camera_x + rng.randint(0, SCREEN_WIDTH)
+                y = rng.randint(0, SCREEN_HEIGHT)
+                self.particle_system.emit("sparkle", x, y)
+
+        # Копим реальное время и прогоняем целое число фиксированных тиков;
+        # всё, что больше MAX_STEPS_PER_FRAME тиков, отбрасываем
+        self.accumulator = min(self.accumulator + delta_time,
+                               MAX_STEPS_PER_FRAME * SIMULATION_DT)
+        while self.accumulator >= SIMULATION_DT:
+            inputs, self.pending_input = self.pending_input, StepInput()
+            if self.session is not None:
+                inputs = self.session.input_for(self.tick, inputs)
+            step(self.state, inputs, SIMULATION_DT)
+            if self.session is not None:
+                self.session.after_step(self.tick, self.state)
+            self.tick += 1
+            self.accumulator -= SIMULATION_DT
+        PROFILER.begin("events")
+        self.handle_events()
+        PROFILER.end("events")
 
     def on_key_press(self, key, modifiers):
-        if self.game_over:
-            if key == arcade.key.SPACE:
-                # Новая игра
-                self.score = 0
-                self.lives = 3
-                self.level = 1
-                self.load_level(self.level)
-            elif key == arcade.key.ESCAPE:
-                start_view = StartView()
-                self.window.show_view(start_view)
-            return
-
-        if self.level_complete:
-            if key == arcade.key.SPACE:
-                if self.level < len(LEVELS):
-                    self.level += 1
-                    self.load_level(self.level)
-                else:
-                    self.score = 0
-                    self.lives = 3
-                    self.level = 1
-                    self.load_level(self.level)
-            elif key == arcade.key.ESCAPE:
-                start_view = StartView()
-                self.window.show_view(start_view)
-            return
-
-        if key == arcade.key.SPACE:
-            if not self.jumping:
-                self.player_dy = PLAYER_JUMP_SPEED
-                self.jumping = True
-                self.was_jumping = True
-                self.particle_system.create_jump_effect(self.player_x, self.player_y)
+        PROFILER.begin("input")
+        if key == arcade.key.ESCAPE:
+            start_view = StartView()
+            self.window.show_view(start_view)
+        elif key == arcade.key.F3:
+            PROFILER.toggle()
+        elif key == arcade.key.Q:
+            self.save_repository.set_quality(QUALITY.cycle())
+        elif key == arcade.key.SPACE:
+            self.pending_input.jump = True
         elif key == arcade.key.LEFT:
-            self.player_dx = -PLAYER_MOVE_SPEED
+            self.pending_input.move = -1
         elif key == arcade.key.RIGHT:
-            self.player_dx = PLAYER_MOVE_SPEED
+            self.pending_input.move = 1
         elif key == arcade.key.R:
-            self.load_level(self.level)
-        elif key == arcade.key.ESCAPE:
-            start_view = StartView()
-            self.window.show_view(start_view)
+            self.pending_input.restart = True
+        PROFILER.end("input")
 
     def on_key_release(self, key, modifiers):
+        PROFILER.begin("input")
         if key in (arcade.key.LEFT, arcade.key.RIGHT):
-            self.player_dx = 0
+            self.pending_input.move = 0
+        PROFILER.end("input")
 
 
 def main():
+    STARTUP.mark("импорт")
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--record", metavar="ФАЙЛ",
+                        help="сразу начать уровень и записать ввод в файл")
+    parser.add_argument("--replay", metavar="ФАЙЛ",
+                        help="повторить записанный забег и сверить состояние")
+    parser.add_argument("--fast", action="store_true",
+                        help="повторять без пауз, с максимальной скоростью")
+    parser.add_argument("--trace", metavar="ФАЙЛ",
+                        help="записать времена кадров повтора в JSON")
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--procedural", action="store_true",
+                        help="записывать забег на случайных картах")
+    parser.add_argument("--quality", choices=["auto"] + [tier.name for tier in QUALITY_TIERS],
+                        help="ступень качества на этот запуск (по умолчанию — из сохранения)")
+    parser.add_argument("--check-levels", type=int, metavar="ЗЁРЕН",
+                        help="проверить расстановку уровней на стольких зёрнах и выйти")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="замерить время до первого кадра меню по фазам и выйти")
+    args = parser.parse_args()
+    if args.level not in LEVELS:
+        parser.error(f"нет уровня {args.level}; есть: {', '.join(map(str, LEVELS))}")
+    STARTUP.enabled = args.profile_startup
+
+    if args.check_levels:
+        return 0 if check_levels(args.check_levels) else 1
+
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
-    start_view = StartView()
-    window.show_view(start_view)
+    STARTUP.mark("окно")
+    if args.replay:
+        QUALITY.pin(args.quality or "auto")
+        # Повтор не должен менять настоящее сохранение
+        with tempfile.TemporaryDirectory() as directory:
+            SaveRepository._instance = SaveRepository(os.path.join(directory, SAVE_FILE))
+            ok = run_replay(window, args.replay, args.fast, args.trace)
+            SaveRepository.get().close()
+        window.close()
+        return 0 if ok else 1
+
+    QUALITY.pin(args.quality or SaveRepository.get().data["quality"])
+    STARTUP.mark("сохранение")
+    recording = None
+    if args.record:
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+        recording = InputRecording(args.level, seed, args.procedural)
+        window.show_view(GameView(args.level, seed, session=InputRecorder(recording),
+                                  procedural=args.procedural))
+    else:
+        window.show_view(StartView())
+        STARTUP.mark("меню")
     arcade.run()
+    SaveRepository.get().close()
+    if recording is not None:
+        recording.save(args.record)
+        print(f"Запись сохранена в {args.record}: {recording.ticks} тиков")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())